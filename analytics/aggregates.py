@@ -0,0 +1,339 @@
+"""
+Aggregates - Streaming, mergeable KPI statistics
+Running count/sum/min/max/Welford variance and t-digest quantiles per machine, per operation and fleet-wide
+"""
+import math
+import threading
+import numpy as np
+
+
+class RunningStats:
+    """Count, sum, min, max and Welford mean/variance with O(1) updates"""
+
+    __slots__ = ('count', 'total', 'min', 'max', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        x = float(x)
+        if math.isnan(x):
+            return
+        self.count += 1
+        self.total += x
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def _combine(self, count, total, lo, hi, mean, m2):
+        # Chan et al. parallel variance
+        if count == 0:
+            return
+        n = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / n
+        self.mean += delta * count / n
+        self.count = n
+        self.total += total
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+
+    def update_batch(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        mean = float(values.mean())
+        self._combine(len(values), float(values.sum()), float(values.min()), float(values.max()),
+                      mean, float(np.square(values - mean).sum()))
+
+    def merge(self, other):
+        self._combine(other.count, other.total, other.min, other.max, other.mean, other.m2)
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        if self.count == 0:
+            return {'count': 0}
+        return {'count': self.count, 'sum': self.total, 'min': self.min, 'max': self.max,
+                'mean': self.mean, 'std': self.std}
+
+
+class TDigest:
+    """Mergeable approximate quantile sketch (merging t-digest)
+
+    Values are buffered and periodically merged into at most about
+    `compression / 2` centroids using the arcsine scale function, which
+    keeps the tails precise. Compression is fully vectorized: sorted
+    points are bucketed by their position in k-space.
+    """
+
+    def __init__(self, compression=100, buffer_size=None):
+        self.compression = compression
+        self.buffer_size = buffer_size or 5 * compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self._buffer = []
+        self._buffered = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self):
+        return float(self.weights.sum()) + self._buffered
+
+    def add(self, x):
+        x = float(x)
+        if math.isnan(x):
+            return
+        self._buffer.append(np.array([x]))
+        self._buffered += 1
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def add_batch(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self._buffer.append(values)
+        self._buffered += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def _compress(self, means=None, weights=None):
+        parts_m = [self.means] + self._buffer
+        parts_w = [self.weights] + [np.ones(len(b)) for b in self._buffer]
+        if means is not None:
+            parts_m.append(means)
+            parts_w.append(weights)
+        self._buffer = []
+        self._buffered = 0
+        m = np.concatenate(parts_m)
+        w = np.concatenate(parts_w)
+        if len(m) == 0:
+            return
+        order = np.argsort(m, kind='stable')
+        m, w = m[order], w[order]
+        total = w.sum()
+        q_mid = (np.cumsum(w) - w / 2) / total
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * q_mid - 1)
+        bucket = np.floor(k + self.compression / 4).astype(np.int64)
+        _, bucket = np.unique(bucket, return_inverse=True)
+        weights = np.bincount(bucket, weights=w)
+        self.means = np.bincount(bucket, weights=w * m) / weights
+        self.weights = weights
+
+    def merge(self, other):
+        other._compress()
+        self._compress(other.means, other.weights)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Approximate q-quantile (0..1); None when empty"""
+        if self._buffered:
+            self._compress()
+        n = len(self.means)
+        if n == 0:
+            return None
+        if n == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        target = q * total
+        # Centroid centres in cumulative weight, anchored at the observed min and max
+        centres = np.cumsum(self.weights) - self.weights / 2
+        xs = np.concatenate([[0.0], centres, [total]])
+        ys = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(target, xs, ys))
+
+
+# Metric name -> source column; vibration magnitude is derived
+KPI_METRICS = {
+    'spindle_speed_rpm': 'spindle_speed_rpm',
+    'spindle_temp_c': 'spindle_temp_c',
+    'power_consumption_kw': 'power_consumption_kw',
+    'cutting_force_n': 'cutting_force_n',
+    'surface_roughness_ra_um': 'surface_roughness_ra_um',
+    'remaining_useful_life_min': 'remaining_useful_life_min',
+    'vibration_magnitude_g': None,
+    'chatter_detected': 'chatter_detected',
+}
+
+# Metrics that also keep a quantile sketch
+QUANTILE_METRICS = ('spindle_temp_c', 'vibration_magnitude_g', 'surface_roughness_ra_um',
+                    'remaining_useful_life_min', 'cutting_force_n')
+
+GROUP_LEVELS = {'machine': 'machine_id', 'operation': 'operation_id'}
+
+
+class _GroupStats:
+    __slots__ = ('stats', 'digests')
+
+    def __init__(self, compression):
+        self.stats = {name: RunningStats() for name in KPI_METRICS}
+        self.digests = {name: TDigest(compression) for name in QUANTILE_METRICS}
+
+    def update_batch(self, columns, rows=None):
+        for name, values in columns.items():
+            v = values if rows is None else values[rows]
+            self.stats[name].update_batch(v)
+            if name in self.digests:
+                self.digests[name].add_batch(v)
+
+    def update(self, values):
+        for name, x in values.items():
+            self.stats[name].update(x)
+            if name in self.digests:
+                self.digests[name].add(x)
+
+    def merge(self, other):
+        for name in self.stats:
+            self.stats[name].merge(other.stats[name])
+        for name in self.digests:
+            self.digests[name].merge(other.digests[name])
+
+
+class KPIAggregator:
+    """Fleet, per-machine and per-operation KPIs maintained incrementally
+
+    `update` costs O(1) per reading and `update_frame` is vectorized per
+    batch. Aggregators built on different partitions can be combined with
+    `merge`. `kpis()` and `insights()` read the running state and never
+    touch the raw history.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.fleet = _GroupStats(self.compression)
+            self.groups = {level: {} for level in GROUP_LEVELS}
+
+    def _group(self, level, key):
+        group = self.groups[level].get(key)
+        if group is None:
+            group = self.groups[level][key] = _GroupStats(self.compression)
+        return group
+
+    @staticmethod
+    def _columns(df):
+        cols = {}
+        for name, source in KPI_METRICS.items():
+            if source is None:
+                cols[name] = np.sqrt(
+                    df['vibration_x_g'].to_numpy(dtype=float) ** 2
+                    + df['vibration_y_g'].to_numpy(dtype=float) ** 2
+                    + df['vibration_z_g'].to_numpy(dtype=float) ** 2
+                )
+            elif source in df.columns:
+                cols[name] = df[source].to_numpy(dtype=float)
+        return cols
+
+    def update_frame(self, df):
+        """Add a batch of readings"""
+        if df is None or len(df) == 0:
+            return
+        cols = self._columns(df)
+        with self._lock:
+            self.fleet.update_batch(cols)
+            for level, column in GROUP_LEVELS.items():
+                if column not in df.columns:
+                    continue
+                for key, rows in df.groupby(column, sort=False).indices.items():
+                    self._group(level, key).update_batch(cols, rows)
+
+    def update(self, record):
+        """Add one reading (dict)"""
+        values = {}
+        for name, source in KPI_METRICS.items():
+            if source is None:
+                values[name] = math.sqrt(sum(float(record.get(f'vibration_{a}_g', 0.0)) ** 2 for a in 'xyz'))
+            elif source in record:
+                values[name] = float(record[source])
+        with self._lock:
+            self.fleet.update(values)
+            for level, column in GROUP_LEVELS.items():
+                if column in record:
+                    self._group(level, record[column]).update(values)
+
+    def merge(self, other):
+        """Fold another aggregator (e.g. from another partition) into this one"""
+        with self._lock:
+            self.fleet.merge(other.fleet)
+            for level, groups in other.groups.items():
+                for key, group in groups.items():
+                    self._group(level, key).merge(group)
+        return self
+
+    @classmethod
+    def from_frame(cls, df, compression=100):
+        agg = cls(compression)
+        agg.update_frame(df)
+        return agg
+
+    def percentiles(self, metric, qs=(0.5, 0.95, 0.99), level=None, key=None):
+        """Approximate percentiles of a metric, fleet-wide or for one machine/operation"""
+        group = self.fleet if level is None else self.groups[level].get(key)
+        if group is None or metric not in group.digests:
+            return {}
+        return {f'p{round(q * 100)}': group.digests[metric].quantile(q) for q in qs}
+
+    def kpis(self, level=None, key=None):
+        """Dashboard KPIs (same keys as dashboard.app.calculate_kpis, plus percentiles)"""
+        with self._lock:
+            group = self.fleet if level is None else self.groups[level].get(key)
+            if group is None:
+                return None
+            s = group.stats
+            return {
+                'total_records': s['spindle_speed_rpm'].count,
+                'avg_spindle_rpm': s['spindle_speed_rpm'].mean,
+                'max_temp': s['spindle_temp_c'].max if s['spindle_temp_c'].count else 0.0,
+                'avg_power': s['power_consumption_kw'].mean,
+                'chatter_events': int(s['chatter_detected'].total),
+                'avg_roughness': s['surface_roughness_ra_um'].mean,
+                'avg_rul': s['remaining_useful_life_min'].mean,
+                'machines': len(self.groups['machine']),
+                'temp_percentiles': self.percentiles('spindle_temp_c', level=level, key=key),
+                'vibration_percentiles': self.percentiles('vibration_magnitude_g', level=level, key=key),
+            }
+
+    def insights(self):
+        """Fleet insights (same keys as CNCAnalytics.generate_insights)"""
+        with self._lock:
+            s = self.fleet.stats
+            chatter = s['chatter_detected']
+            return {
+                'total_records': s['spindle_speed_rpm'].count,
+                'machines': len(self.groups['machine']),
+                'operations': len(self.groups['operation']),
+                'avg_spindle_rpm': s['spindle_speed_rpm'].mean,
+                'avg_temp': s['spindle_temp_c'].mean,
+                'chatter_events': int(chatter.total),
+                'chatter_rate': chatter.mean,
+                'avg_roughness': s['surface_roughness_ra_um'].mean,
+                'avg_rul': s['remaining_useful_life_min'].mean,
+            }
@@ -4,6 +4,8 @@ Comprehensive machine learning for predictive maintenance
 """
 import os
 import sys
+import json
+from datetime import datetime
 import pandas as pd
 import numpy as np
 import joblib
@@ -16,8 +18,64 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from config.settings import (
     DATASET_CSV, MODELS_DIR, TEST_SIZE, RANDOM_STATE,
-    N_ESTIMATORS_REGRESSION, N_ESTIMATORS_CLASSIFICATION
+    N_ESTIMATORS_REGRESSION, N_ESTIMATORS_CLASSIFICATION, TRAINING_MODE, FEATURE_WINDOW_READINGS
 )
+from data.store import load_dataset_frame, dataset_hash
+from analytics.compiled_forest import export_models
+from analytics.features import training_arrays, MODEL_COLUMNS, WINDOWED_COLUMNS
+from analytics.aggregates import KPIAggregator
+from analytics.incremental import IncrementalTrainer, STATE_FILE
+
+METRICS_FILE = 'metrics.json'
+MODEL_NAMES = ('roughness', 'wear')
+
+
+def training_settings():
+    """Settings that change the trained models; part of the cache key"""
+    return {
+        'test_size': TEST_SIZE,
+        'random_state': RANDOM_STATE,
+        'n_estimators_regression': N_ESTIMATORS_REGRESSION,
+        'n_estimators_classification': N_ESTIMATORS_CLASSIFICATION,
+        'features': MODEL_COLUMNS,
+        'feature_window_readings': FEATURE_WINDOW_READINGS if set(WINDOWED_COLUMNS) & set(MODEL_COLUMNS) else None,
+    }
+
+
+def models_dir():
+    return os.path.join(os.path.dirname(__file__), MODELS_DIR)
+
+
+def replace_atomically(path, write):
+    """Call `write(tmp_path)`, then move the result over `path` so readers never see a partial file"""
+    tmp_path = f'{path}.tmp'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_metrics_artifact(models_path=None):
+    """Saved metrics.json contents, or None"""
+    path = os.path.join(models_path or models_dir(), METRICS_FILE)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def artifact_is_current(artifact, data_hash, models_path=None):
+    """True when the artifact was trained on `data_hash` with the current settings and the models exist"""
+    models_path = models_path or models_dir()
+    return (
+        artifact is not None
+        and artifact.get('dataset_hash') == data_hash
+        and artifact.get('settings') == training_settings()
+        and all(os.path.exists(os.path.join(models_path, f'{name}_model.pkl')) for name in MODEL_NAMES)
+    )
 
 
 class CNCAnalytics:
@@ -30,11 +88,17 @@ class CNCAnalytics:
         self.df = None
         self.models = {}
         self.metrics = {}
+        self.dataset_hash = None
+        self.aggregates = None
+        self.trainer = None
         
-    def load_data(self):
-        """Load dataset"""
+    def load_data(self, columns=None, machines=None, start=None, end=None):
+        """Load dataset (Parquet store when enabled, else CSV), optionally projected and filtered"""
         print(f"📊 Loading dataset from: {self.dataset_path}")
-        self.df = pd.read_csv(self.dataset_path, parse_dates=['timestamp'])
+        self.df = load_dataset_frame(self.dataset_path, columns=columns, machines=machines, start=start, end=end)
+        self.dataset_hash = dataset_hash(self.dataset_path)
+        if any(v is not None for v in (columns, machines, start, end)):
+            self.dataset_hash += f'|columns={columns}|machines={machines}|start={start}|end={end}'
         print(f"   ✓ Loaded {len(self.df)} records")
         return self.df
     
@@ -42,21 +106,10 @@ class CNCAnalytics:
         """Train all ML models"""
         print("\n🤖 Training machine learning models...")
         
-        # Feature columns
-        features = [
-            'spindle_speed_rpm', 'feed_rate_mm_min', 
-            'vibration_x_g', 'vibration_y_g', 'vibration_z_g',
-            'spindle_temp_c', 'motor_temp_c', 
-            'cutting_force_n', 'acoustic_emission_ae', 
-            'power_consumption_kw'
-        ]
-        
-        df_clean = self.df.dropna(subset=features + ['surface_roughness_ra_um', 'tool_wear_state'])
+        X, y_roughness, y_wear = training_arrays(self.df)
         
         # Train surface roughness predictor
         print("\n   Training surface roughness model...")
-        X = df_clean[features].values
-        y_roughness = df_clean['surface_roughness_ra_um'].values
         
         X_train, X_test, y_train, y_test = train_test_split(
             X, y_roughness, test_size=TEST_SIZE, random_state=RANDOM_STATE
@@ -80,8 +133,6 @@ class CNCAnalytics:
         
         # Train tool wear classifier
         print("\n   Training tool wear model...")
-        y_wear = df_clean['tool_wear_state'].values.astype(int)
-        
         X_train, X_test, y_train, y_test = train_test_split(
             X, y_wear, test_size=TEST_SIZE, random_state=RANDOM_STATE
         )
@@ -100,34 +151,112 @@ class CNCAnalytics:
         self.metrics['wear_accuracy'] = acc
         print(f"   ✓ Wear model: Accuracy={acc:.3f}")
         
+        # Seed incremental updates with these models, their test metrics and a sample of the history
+        self.trainer = IncrementalTrainer.from_training(
+            self.models, X, y_roughness, y_wear, self.metrics,
+            trained_until=self.df['timestamp'].max() if 'timestamp' in self.df.columns else None
+        )
+        
         return self.models, self.metrics
     
+    def update_models(self):
+        """
+        Update the saved models from rows newer than they were trained on
+        
+        Returns False when there is nothing to update from (no saved
+        incremental state, changed training settings, or no newer rows),
+        in which case a full train_models() is needed.
+        """
+        models_path = models_dir()
+        artifact = load_metrics_artifact(models_path)
+        if artifact is None or artifact.get('settings') != training_settings():
+            return False
+        try:
+            models = {name: joblib.load(os.path.join(models_path, f'{name}_model.pkl')) for name in MODEL_NAMES}
+        except FileNotFoundError:
+            return False
+        trainer = IncrementalTrainer.load(os.path.join(models_path, STATE_FILE), models)
+        if trainer is None or trainer.trained_until is None:
+            return False
+        new = self.df[self.df['timestamp'] > trainer.trained_until]
+        X, y_roughness, y_wear = training_arrays(new)
+        if len(X) == 0:
+            return False
+        
+        print(f"\n🔁 Updating models from {len(X)} new records...")
+        report = trainer.update(X, y_roughness, y_wear, trained_until=new['timestamp'].max())
+        drift = report['drift']
+        print(f"   Window before update: R²={report['metrics']['roughness_r2']:.3f}, "
+              f"Accuracy={report['metrics']['wear_accuracy']:.3f}, max PSI={drift['psi_max']:.3f}")
+        if report['mode'] == 'full':
+            print(f"   ⚠ Drift ({', '.join(drift['reasons'])}): retrained on reservoir + window in {report['fit_seconds']:.1f}s")
+        else:
+            print(f"   ✓ Added trees in {report['fit_seconds']:.1f}s ({report['trees']['roughness']} / {report['trees']['wear']} trees)")
+        
+        self.models = trainer.models
+        self.metrics = report['metrics']
+        self.trainer = trainer
+        return True
+    
+    def load_saved_models(self):
+        """
+        Reuse persisted models and metrics if they were trained on the loaded dataset
+        
+        Returns True when the saved artifact matches and training can be skipped.
+        """
+        models_path = models_dir()
+        artifact = load_metrics_artifact(models_path)
+        if not artifact_is_current(artifact, self.dataset_hash, models_path):
+            return False
+        self.models = {
+            name: joblib.load(os.path.join(models_path, f'{name}_model.pkl'))
+            for name in MODEL_NAMES
+        }
+        self.metrics = artifact['metrics']
+        print(f"\n♻ Reusing models trained on this dataset ({artifact['trained_at']})")
+        return True
+    
     def save_models(self):
-        """Save trained models to disk"""
-        models_path = os.path.join(os.path.dirname(__file__), MODELS_DIR)
+        """Save trained models and their metrics artifact to disk"""
+        models_path = models_dir()
         os.makedirs(models_path, exist_ok=True)
         
         print(f"\n💾 Saving models to: {models_path}")
         for name, model in self.models.items():
             path = os.path.join(models_path, f'{name}_model.pkl')
-            joblib.dump(model, path)
+            replace_atomically(path, lambda tmp: joblib.dump(model, tmp))
             print(f"   ✓ Saved {name} model")
+        
+        # Flat NumPy copies for the compiled inference path
+        export_models(self.models, models_path)
+        print("   ✓ Exported compiled models")
+        
+        if self.trainer is not None:
+            self.trainer.save(os.path.join(models_path, STATE_FILE))
+            print("   ✓ Saved incremental training state")
+        
+        # Written last, so a current artifact implies the models above are complete
+        artifact = {
+            'dataset_hash': self.dataset_hash,
+            'settings': training_settings(),
+            'metrics': {k: float(v) for k, v in self.metrics.items()},
+            'trained_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        }
+        def write_artifact(tmp):
+            with open(tmp, 'w') as f:
+                json.dump(artifact, f, indent=2)
+        replace_atomically(os.path.join(models_path, METRICS_FILE), write_artifact)
+        print("   ✓ Saved metrics artifact")
     
     def generate_insights(self):
         """Generate key insights from data"""
         print("\n📈 Generating insights...")
         
-        insights = {
-            'total_records': len(self.df),
-            'machines': self.df['machine_id'].nunique(),
-            'operations': self.df['operation_id'].nunique(),
-            'avg_spindle_rpm': float(self.df['spindle_speed_rpm'].mean()),
-            'avg_temp': float(self.df['spindle_temp_c'].mean()),
-            'chatter_events': int(self.df['chatter_detected'].sum()),
-            'chatter_rate': float(self.df['chatter_detected'].mean()),
-            'avg_roughness': float(self.df['surface_roughness_ra_um'].mean()),
-            'avg_rul': float(self.df['remaining_useful_life_min'].mean()),
-        }
+        # Same running aggregates the dashboard maintains, built in one vectorized pass
+        self.aggregates = KPIAggregator.from_frame(self.df)
+        insights = self.aggregates.insights()
+        insights['temp_p95'] = self.aggregates.percentiles('spindle_temp_c', qs=(0.95,))['p95']
+        insights['vibration_p95'] = self.aggregates.percentiles('vibration_magnitude_g', qs=(0.95,))['p95']
         
         for key, value in insights.items():
             print(f"   {key}: {value}")
@@ -135,16 +264,26 @@ class CNCAnalytics:
         return insights
 
 
-def run_full_analysis(dataset_path=None):
-    """Run complete analysis pipeline"""
+def run_full_analysis(dataset_path=None, force=False, incremental=None):
+    """
+    Run complete analysis pipeline; training is skipped when saved models match the dataset
+    
+    In incremental mode (default: TRAINING_MODE) saved models are updated
+    from the new rows instead of being retrained on the whole history.
+    """
+    if incremental is None:
+        incremental = TRAINING_MODE == 'incremental'
+
     print("="*60)
     print("CNC DIGITAL TWIN - ANALYTICS")
     print("="*60)
     
     analytics = CNCAnalytics(dataset_path)
     analytics.load_data()
-    analytics.train_models()
-    analytics.save_models()
+    if force or not analytics.load_saved_models():
+        if force or not incremental or not analytics.update_models():
+            analytics.train_models()
+        analytics.save_models()
     insights = analytics.generate_insights()
     
     print("\n✅ Analysis complete!")
@@ -154,4 +293,4 @@ def run_full_analysis(dataset_path=None):
 
 
 if __name__ == "__main__":
-    run_full_analysis()
+    run_full_analysis(force='--force' in sys.argv, incremental=True if '--incremental' in sys.argv else None)
@@ -0,0 +1,340 @@
+"""
+Compiled Forest - Flat NumPy representation of trained random forests
+Exports sklearn forests to contiguous node arrays and evaluates them vectorized
+"""
+import os
+import sys
+import time
+import struct
+import zipfile
+import argparse
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import MODELS_DIR, DATASET_CSV
+
+
+class CompiledForest:
+    """Random forest flattened into contiguous node arrays
+    
+    All trees share one set of arrays; `roots` holds each tree's first node.
+    Leaves point to themselves with an infinite threshold, so every
+    (sample, tree) pair advances with the same gather-and-compare step.
+    Exposes `predict` (and `predict_proba`/`classes_` for classifiers) like
+    the sklearn estimator it was built from.
+    
+    Saved files are uncompressed .npz archives that `load(mmap_mode='r')`
+    maps straight from the page cache, so every process scoring the same
+    file shares one copy of the node arrays.
+    """
+    
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'depth', 'roots')
+    DERIVED = ('children', 'is_leaf')
+    
+    def __init__(self, feature, threshold, left, right, value, depth, roots, classes=None,
+                 n_features=None, chunk_size=1024, children=None, is_leaf=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold)
+        self.left = np.ascontiguousarray(left, dtype=np.int32)
+        self.right = np.ascontiguousarray(right, dtype=np.int32)
+        self.value = np.ascontiguousarray(value)
+        self.depth = np.ascontiguousarray(depth, dtype=np.int32)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        self.classes_ = None if classes is None else np.asarray(classes)
+        self.n_features_in_ = n_features
+        self.chunk_size = chunk_size
+        # Interleaved (left, right) pairs so one gather picks the next node
+        if children is None:
+            children = np.stack([self.left, self.right], axis=1).ravel()
+        self._children = np.ascontiguousarray(children, dtype=np.int32)
+        if is_leaf is None:
+            is_leaf = self.left == np.arange(len(self.left), dtype=np.int32)
+        self._is_leaf = np.ascontiguousarray(is_leaf, dtype=bool)
+    
+    @property
+    def is_classifier(self):
+        return self.classes_ is not None
+    
+    @property
+    def n_trees(self):
+        return len(self.roots)
+    
+    @property
+    def max_depth(self):
+        return int(self.depth.max()) if len(self.depth) else 0
+    
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+    
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten a fitted RandomForestRegressor or RandomForestClassifier"""
+        is_classifier = hasattr(model, 'classes_')
+        features, thresholds, lefts, rights, values, depths, roots = [], [], [], [], [], [], []
+        offset = 0
+        for est in model.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            leaf = tree.children_left < 0
+            node_ids = np.arange(n, dtype=np.int32) + offset
+            
+            feature = np.where(leaf, 0, tree.feature).astype(np.int32)
+            threshold = np.where(leaf, np.inf, tree.threshold)
+            left = np.where(leaf, node_ids, tree.children_left + offset).astype(np.int32)
+            right = np.where(leaf, node_ids, tree.children_right + offset).astype(np.int32)
+            if is_classifier:
+                value = tree.value[:, 0, :]
+                value = value / value.sum(axis=1, keepdims=True)
+            else:
+                value = tree.value[:, 0, 0]
+            
+            depth = np.zeros(n, dtype=np.int32)
+            for node in range(n):  # children always come after their parent
+                if not leaf[node]:
+                    depth[tree.children_left[node]] = depth[node] + 1
+                    depth[tree.children_right[node]] = depth[node] + 1
+            
+            features.append(feature); thresholds.append(threshold)
+            lefts.append(left); rights.append(right)
+            values.append(value); depths.append(depth)
+            roots.append(offset)
+            offset += n
+        
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(lefts), np.concatenate(rights),
+            np.concatenate(values), np.concatenate(depths), np.array(roots),
+            classes=model.classes_ if is_classifier else None,
+            n_features=model.n_features_in_,
+        )
+    
+    def _leaves(self, X):
+        """Leaf node index reached in every tree, shape (n_samples, n_trees)
+        
+        Walks all (sample, tree) pairs as flat arrays and drops pairs from
+        the active set as soon as they reach a leaf.
+        """
+        n, n_features = X.shape
+        flat_x = X.ravel()
+        node = np.tile(self.roots, n)
+        row_offset = np.repeat(np.arange(n, dtype=np.int64) * n_features, self.n_trees)
+        position = np.arange(n * self.n_trees)
+        leaves = np.empty(n * self.n_trees, dtype=np.int32)
+        
+        while len(node):
+            go_right = flat_x[row_offset + self.feature[node]] > self.threshold[node]
+            node = self._children[2 * node + go_right]
+            done = self._is_leaf[node]
+            if done.any():
+                leaves[position[done]] = node[done]
+                active = ~done
+                node, row_offset, position = node[active], row_offset[active], position[active]
+        return leaves.reshape(n, self.n_trees)
+    
+    def _mean_value(self, X):
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        out = []
+        for start in range(0, len(X), self.chunk_size):
+            leaves = self._leaves(X[start:start + self.chunk_size])
+            out.append(self.value[leaves].astype(np.float64).mean(axis=1))
+        if not out:
+            return np.empty((0,) + self.value.shape[1:])
+        return np.concatenate(out)
+    
+    def predict(self, X):
+        if self.is_classifier:
+            return self.classes_[self.predict_proba(X).argmax(axis=1)]
+        return self._mean_value(X)
+    
+    def predict_proba(self, X):
+        if not self.is_classifier:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._mean_value(X)
+    
+    def prune(self, n_trees=None, max_depth=None):
+        """
+        Smaller copy keeping the first `n_trees` trees, cut at `max_depth`
+        
+        Nodes at the depth limit become leaves carrying their own node value,
+        which sklearn stores for internal nodes too; nodes below it are dropped.
+        """
+        keep = self.n_trees if n_trees is None else min(n_trees, self.n_trees)
+        end = len(self.feature) if keep == self.n_trees else self.roots[keep]
+        feature = self.feature[:end].copy()
+        threshold = self.threshold[:end].copy()
+        left = self.left[:end].copy()
+        right = self.right[:end].copy()
+        depth = self.depth[:end].copy()
+        if max_depth is not None:
+            cut = depth >= max_depth
+            node_ids = np.arange(end, dtype=np.int32)
+            feature[cut] = 0
+            threshold[cut] = np.inf
+            left[cut] = node_ids[cut]
+            right[cut] = node_ids[cut]
+        
+        # Drop nodes below the cut and renumber the survivors
+        reachable = depth <= max_depth if max_depth is not None else np.ones(end, dtype=bool)
+        new_id = np.cumsum(reachable, dtype=np.int64).astype(np.int32) - 1
+        return CompiledForest(
+            feature[reachable], threshold[reachable],
+            new_id[left[reachable]], new_id[right[reachable]],
+            self.value[:end][reachable], depth[reachable], new_id[self.roots[:keep]],
+            classes=self.classes_, n_features=self.n_features_in_, chunk_size=self.chunk_size
+        )
+    
+    def quantize(self, dtype=np.float16):
+        """Copy with thresholds and leaf values stored at reduced precision"""
+        threshold = self.threshold.astype(dtype)
+        return CompiledForest(
+            self.feature, threshold, self.left, self.right, self.value.astype(dtype),
+            self.depth, self.roots, classes=self.classes_,
+            n_features=self.n_features_in_, chunk_size=self.chunk_size
+        )
+    
+    def save(self, path):
+        """Write an uncompressed .npz (derived arrays included) and move it into place atomically"""
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        arrays['children'] = self._children
+        arrays['is_leaf'] = self._is_leaf
+        if self.is_classifier:
+            arrays['classes'] = self.classes_
+        arrays['n_features'] = np.array(self.n_features_in_ or 0)
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Load a saved forest; with `mmap_mode` the node arrays are memory-mapped rather than read"""
+        data = _map_npz(path, mmap_mode) if mmap_mode else None
+        if data is None:
+            with np.load(path) as npz:
+                data = {name: npz[name] for name in npz.files}
+        arrays = {name: data[name] for name in cls.ARRAYS}
+        derived = {name: data.get(name) for name in cls.DERIVED}
+        n_features = int(data['n_features']) or None
+        return cls(**arrays, **derived, classes=data.get('classes'), n_features=n_features)
+
+
+def _map_npz(path, mmap_mode='r'):
+    """Memory-map every member of an uncompressed .npz; None if any member is compressed
+
+    np.load cannot map archive members, but np.savez stores each .npy
+    uncompressed, so its data can be mapped at its offset in the file.
+    """
+    arrays = {}
+    with open(path, 'rb') as f, zipfile.ZipFile(f) as archive:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                return None
+            # Local file header: 30 fixed bytes, then the name and extra fields
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if dtype.hasobject:
+                return None
+            arrays[name] = np.memmap(path, dtype=dtype, mode=mmap_mode, offset=f.tell(), shape=shape,
+                                     order='F' if fortran_order else 'C')
+    return arrays
+
+
+def _time_call(fn, X, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn(X)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def compare(model, compiled, X, y):
+    """Accuracy, agreement with the original and speed of a compiled forest"""
+    from sklearn.metrics import r2_score, accuracy_score
+    
+    t_ref, ref = _time_call(model.predict, X)
+    t_cmp, pred = _time_call(compiled.predict, X)
+    t_ref_one, _ = _time_call(model.predict, X[:1], repeats=10)
+    t_cmp_one, _ = _time_call(compiled.predict, X[:1], repeats=10)
+    if compiled.is_classifier:
+        score_name, score = 'accuracy', accuracy_score(y, pred)
+        agreement = float(np.mean(pred == ref))
+    else:
+        score_name, score = 'r2', r2_score(y, pred)
+        agreement = float(np.max(np.abs(pred - ref))) if len(pred) else 0.0
+    return {
+        'trees': compiled.n_trees,
+        'max_depth': compiled.max_depth,
+        'size_kb': compiled.nbytes / 1024,
+        score_name: score,
+        'agreement' if compiled.is_classifier else 'max_abs_diff': agreement,
+        'sklearn_ms': t_ref * 1000,
+        'compiled_ms': t_cmp * 1000,
+        'speedup': t_ref / t_cmp if t_cmp > 0 else float('inf'),
+        'sklearn_1row_ms': t_ref_one * 1000,
+        'compiled_1row_ms': t_cmp_one * 1000,
+    }
+
+
+def export_models(models, models_path):
+    """Write `<name>_model.npz` next to the pickles for every trained forest"""
+    paths = {}
+    for name, model in models.items():
+        path = os.path.join(models_path, f'{name}_model.npz')
+        CompiledForest.from_sklearn(model).save(path)
+        paths[name] = path
+    return paths
+
+
+def main():
+    import joblib
+    from analytics.analyze import CNCAnalytics
+    from analytics.features import training_arrays
+    
+    ap = argparse.ArgumentParser(description='Compile trained forests and report accuracy/speed trade-offs')
+    ap.add_argument('--dataset', default=os.path.join(os.path.dirname(__file__), '..', DATASET_CSV))
+    ap.add_argument('--rows', type=int, default=10000, help='Rows to score in the benchmark')
+    args = ap.parse_args()
+    
+    models_path = os.path.join(os.path.dirname(__file__), MODELS_DIR)
+    analytics = CNCAnalytics(args.dataset)
+    df = analytics.load_data()
+    df = df.sample(n=args.rows, replace=len(df) < args.rows, random_state=0)
+    X, y_roughness, y_wear = training_arrays(df)
+    targets = {'roughness': y_roughness, 'wear': y_wear}
+    
+    for name, y in targets.items():
+        model = joblib.load(os.path.join(models_path, f'{name}_model.pkl'))
+        compiled = CompiledForest.from_sklearn(model)
+        compiled.save(os.path.join(models_path, f'{name}_model.npz'))
+        variants = [
+            ('compiled', compiled),
+            ('half trees', compiled.prune(n_trees=max(1, compiled.n_trees // 2))),
+            ('depth 12', compiled.prune(max_depth=12)),
+            ('depth 8', compiled.prune(max_depth=8)),
+            ('float16', compiled.quantize(np.float16)),
+        ]
+        print(f"\n{name} model ({len(X)} rows)")
+        for label, variant in variants:
+            report = compare(model, variant, X, y)
+            cells = ', '.join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in report.items())
+            print(f"   {label:<11} {cells}")
+
+
+if __name__ == '__main__':
+    main()
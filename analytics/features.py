@@ -0,0 +1,315 @@
+"""
+Features - Shared feature extraction for training, batch scoring and online scoring
+One feature list, float32 matrices, and incremental windowed features per machine
+"""
+import os
+import sys
+import threading
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import FEATURE_WINDOWED, FEATURE_WINDOW_READINGS, FEATURE_SPECTRAL
+from analytics.spectral import spectral_columns, spectral_engine
+
+# Model input columns, in training order
+FEATURE_COLUMNS = [
+    'spindle_speed_rpm', 'feed_rate_mm_min',
+    'vibration_x_g', 'vibration_y_g', 'vibration_z_g',
+    'spindle_temp_c', 'motor_temp_c',
+    'cutting_force_n', 'acoustic_emission_ae',
+    'power_consumption_kw'
+]
+
+# Substituted when an online reading lacks a field; counted in FeatureMatrix.missing
+FEATURE_DEFAULTS = {
+    'spindle_speed_rpm': 5000,
+    'feed_rate_mm_min': 800,
+    'vibration_x_g': 0.5,
+    'vibration_y_g': 0.5,
+    'vibration_z_g': 0.5,
+    'spindle_temp_c': 60,
+    'motor_temp_c': 50,
+    'cutting_force_n': 400,
+    'acoustic_emission_ae': 5,
+    'power_consumption_kw': 5,
+    'vibration_rms_g': 0.87,
+    'spindle_temp_slope_c_per_s': 0.0,
+}
+
+TARGET_ROUGHNESS = 'surface_roughness_ra_um'
+TARGET_WEAR = 'tool_wear_state'
+
+# Windowed features derived per machine by WindowedFeatures / windowed_features()
+WINDOWED_COLUMNS = ['vibration_rms_g', 'spindle_temp_slope_c_per_s']
+
+# Latest spectrum of each row's machine, from a SpectralEngine fed with high-rate vibration streams
+SPECTRAL_COLUMNS = spectral_columns()
+
+# What the models are trained and scored on
+MODEL_COLUMNS = (FEATURE_COLUMNS + (WINDOWED_COLUMNS if FEATURE_WINDOWED else [])
+                 + (SPECTRAL_COLUMNS if FEATURE_SPECTRAL else []))
+
+
+class FeatureMatrix:
+    """C-contiguous float32 feature matrix with named, zero-copy column views"""
+
+    def __init__(self, X, columns=FEATURE_COLUMNS, missing=None):
+        self.X = X
+        self.columns = list(columns)
+        self.missing = missing if missing is not None else np.zeros(len(X), dtype=np.int32)
+        self._index = {name: i for i, name in enumerate(self.columns)}
+
+    def __len__(self):
+        return len(self.X)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.X if dtype is None else self.X.astype(dtype, copy=False)
+
+    def column(self, name):
+        """View of one feature column (no copy)"""
+        return self.X[:, self._index[name]]
+
+
+def _fill(X, missing, i, name):
+    nan = np.isnan(X[:, i])
+    if nan.any():
+        X[nan, i] = FEATURE_DEFAULTS.get(name, 0.0)
+        missing += nan
+
+
+def frame_to_matrix(df, columns=MODEL_COLUMNS, windows=None, spectra=None):
+    """
+    Feature matrix from a DataFrame; missing columns are filled with defaults
+    
+    Windowed columns are derived from the frame's machine_id/timestamp/
+    vibration/temperature columns: by updating `windows` (a
+    WindowedFeatures carried across batches) when given, otherwise from
+    the frame alone. Spectral columns take the current spectrum of each
+    row's machine from `spectra` (default: the shared SpectralEngine).
+    """
+    X = np.empty((len(df), len(columns)), dtype=np.float32)
+    missing = np.zeros(len(df), dtype=np.int32)
+    windowed = spectral = None
+    if any(name in WINDOWED_COLUMNS and name not in df.columns for name in columns) and _has_window_inputs(df):
+        windowed = windows.update_frame(df) if windows is not None else windowed_features(df)
+    if any(name in SPECTRAL_COLUMNS and name not in df.columns for name in columns) and 'machine_id' in df.columns:
+        spectral = (spectra if spectra is not None else spectral_engine()).feature_matrix(df['machine_id'])
+    for i, name in enumerate(columns):
+        if name in df.columns:
+            X[:, i] = df[name].to_numpy(dtype=np.float32, na_value=np.nan)
+        elif windowed is not None and name in WINDOWED_COLUMNS:
+            X[:, i] = windowed[:, WINDOWED_COLUMNS.index(name)]
+        elif spectral is not None and name in SPECTRAL_COLUMNS:
+            X[:, i] = spectral[:, SPECTRAL_COLUMNS.index(name)]
+        else:
+            X[:, i] = np.nan
+        _fill(X, missing, i, name)
+    return FeatureMatrix(X, columns, missing)
+
+
+def records_to_matrix(readings, columns=MODEL_COLUMNS, windows=None, spectra=None):
+    """
+    Feature matrix from a list of telemetry dicts, built column by column
+    
+    Windowed columns come from `windows` (default: the shared online
+    state) for readings that carry machine_id and timestamp, and spectral
+    columns from `spectra` (default: the shared SpectralEngine) for
+    readings that carry machine_id; the rest get defaults.
+    """
+    n = len(readings)
+    X = np.empty((n, len(columns)), dtype=np.float32)
+    missing = np.zeros(n, dtype=np.int32)
+    for i, name in enumerate(columns):
+        if name not in WINDOWED_COLUMNS and name not in SPECTRAL_COLUMNS:
+            X[:, i] = np.fromiter((r.get(name, np.nan) for r in readings), dtype=np.float32, count=n)
+    if any(name in WINDOWED_COLUMNS for name in columns):
+        windowed = (windows if windows is not None else online_windows).update_records(readings)
+        for i, name in enumerate(columns):
+            if name in WINDOWED_COLUMNS:
+                X[:, i] = windowed[:, WINDOWED_COLUMNS.index(name)]
+    if any(name in SPECTRAL_COLUMNS for name in columns):
+        spectral = (spectra if spectra is not None else spectral_engine()).feature_matrix(
+            [r.get('machine_id') for r in readings])
+        for i, name in enumerate(columns):
+            if name in SPECTRAL_COLUMNS:
+                X[:, i] = spectral[:, SPECTRAL_COLUMNS.index(name)]
+    for i, name in enumerate(columns):
+        _fill(X, missing, i, name)
+    return FeatureMatrix(X, columns, missing)
+
+
+def training_arrays(df, columns=MODEL_COLUMNS):
+    """(X, y_roughness, y_wear) for rows with all features and both targets present"""
+    # Windows span every reading of a machine, so derive them before dropping incomplete rows
+    X = frame_to_matrix(df, columns).X
+    keep = df[[c for c in columns if c in df.columns] + [TARGET_ROUGHNESS, TARGET_WEAR]].notna().all(axis=1).to_numpy()
+    return X[keep], df[TARGET_ROUGHNESS].to_numpy()[keep], df[TARGET_WEAR].to_numpy()[keep].astype(int)
+
+
+WINDOW_INPUTS = ('machine_id', 'timestamp', 'vibration_x_g', 'vibration_y_g', 'vibration_z_g', 'spindle_temp_c')
+
+
+def _has_window_inputs(df):
+    return all(name in df.columns for name in WINDOW_INPUTS)
+
+
+def vibration_magnitude(vx, vy, vz):
+    return np.sqrt(np.square(vx) + np.square(vy) + np.square(vz))
+
+
+class WindowedFeatures:
+    """Rolling per-machine features over the last `window` readings, O(1) per reading
+
+    Keeps a ring buffer per machine with running sums for the vibration
+    RMS and for a least-squares temperature slope. Times are kept relative
+    to a per-machine reference that is moved forward, and the sums
+    recomputed, each time the ring wraps, so the slope stays accurate on
+    long streams.
+    """
+
+    def __init__(self, window=FEATURE_WINDOW_READINGS):
+        self.window = window
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def _new_state(self, t):
+        w = self.window
+        return {
+            't': np.zeros(w), 'y': np.zeros(w), 'v2': np.zeros(w),
+            'head': 0, 'count': 0, 'ref': t,
+            'st': 0.0, 'sy': 0.0, 'stt': 0.0, 'sty': 0.0, 'sv2': 0.0,
+        }
+
+    def _rebase(self, s):
+        n = s['count']
+        t, y = s['t'][:n], s['y'][:n]
+        shift = t.min()
+        t -= shift
+        s['ref'] += shift
+        s['st'], s['sy'] = t.sum(), y.sum()
+        s['stt'], s['sty'] = (t * t).sum(), (t * y).sum()
+        s['sv2'] = s['v2'][:n].sum()
+
+    def update(self, machine_id, t_seconds, vib_mag, spindle_temp):
+        """Add one reading; returns (vibration_rms_g, spindle_temp_slope_c_per_s)"""
+        s = self._state.get(machine_id)
+        if s is None:
+            s = self._state[machine_id] = self._new_state(t_seconds)
+        i = s['head']
+        t = t_seconds - s['ref']
+        v2 = vib_mag * vib_mag
+        if s['count'] == self.window:
+            ot, oy = s['t'][i], s['y'][i]
+            s['st'] -= ot; s['sy'] -= oy
+            s['stt'] -= ot * ot; s['sty'] -= ot * oy
+            s['sv2'] -= s['v2'][i]
+        else:
+            s['count'] += 1
+        s['t'][i], s['y'][i], s['v2'][i] = t, spindle_temp, v2
+        s['st'] += t; s['sy'] += spindle_temp
+        s['stt'] += t * t; s['sty'] += t * spindle_temp
+        s['sv2'] += v2
+        s['head'] = (i + 1) % self.window
+        if s['head'] == 0:
+            self._rebase(s)
+
+        n = s['count']
+        rms = np.sqrt(max(s['sv2'], 0.0) / n)
+        denom = n * s['stt'] - s['st'] * s['st']
+        slope = (n * s['sty'] - s['st'] * s['sy']) / denom if n > 1 and denom > 1e-9 else 0.0
+        return float(rms), float(slope)
+
+    def _update_arrays(self, machines, t, mag, temp, valid):
+        out = np.full((len(machines), len(WINDOWED_COLUMNS)), np.nan, dtype=np.float32)
+        with self._lock:
+            for i in np.flatnonzero(valid):
+                out[i] = self.update(machines[i], t[i], mag[i], temp[i])
+        return out
+
+    def update_frame(self, df):
+        """Update from a batch of rows in arrival order; returns an (n, 2) float32 array"""
+        mag = vibration_magnitude(
+            df['vibration_x_g'].to_numpy(dtype=float),
+            df['vibration_y_g'].to_numpy(dtype=float),
+            df['vibration_z_g'].to_numpy(dtype=float),
+        )
+        temp = df['spindle_temp_c'].to_numpy(dtype=float)
+        t = _epoch_seconds(df['timestamp'])
+        valid = ~(np.isnan(t) | np.isnan(mag) | np.isnan(temp))
+        return self._update_arrays(df['machine_id'].to_numpy(), t, mag, temp, valid)
+
+    def update_records(self, readings):
+        """Update from telemetry dicts; rows without machine_id/timestamp or inputs come back NaN"""
+        n = len(readings)
+
+        def column(name):
+            return np.fromiter((r.get(name, np.nan) for r in readings), dtype=float, count=n)
+
+        machines = [r.get('machine_id') for r in readings]
+        stamps = [r.get('timestamp') for r in readings]
+        t = np.full(n, np.nan)
+        dated = [i for i, ts in enumerate(stamps) if ts is not None]
+        if dated:
+            t[dated] = _epoch_seconds([stamps[i] for i in dated])
+        mag = vibration_magnitude(column('vibration_x_g'), column('vibration_y_g'), column('vibration_z_g'))
+        temp = column('spindle_temp_c')
+        valid = ~(np.isnan(t) | np.isnan(mag) | np.isnan(temp)) & np.array([m is not None for m in machines])
+        return self._update_arrays(machines, t, mag, temp, valid)
+
+
+def _epoch_seconds(timestamps):
+    import pandas as pd
+    ts = pd.DatetimeIndex(pd.to_datetime(timestamps, utc=True))
+    return (ts - pd.Timestamp(0, tz='UTC')).total_seconds().to_numpy()
+
+
+def windowed_features(df, window=FEATURE_WINDOW_READINGS):
+    """
+    Windowed features for a whole frame at once, matching WindowedFeatures
+    
+    Rows are taken in their current order within each machine; partial
+    windows at the start of a machine's history use the readings available.
+    Rows missing an input are skipped (NaN), as WindowedFeatures skips them.
+    Returns an (n, 2) float32 array aligned with `df`.
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+    
+    out = np.full((len(df), len(WINDOWED_COLUMNS)), np.nan, dtype=np.float32)
+    if len(df) == 0:
+        return out
+    t_all = _epoch_seconds(df['timestamp'])
+    mag_all = vibration_magnitude(
+        df['vibration_x_g'].to_numpy(dtype=float),
+        df['vibration_y_g'].to_numpy(dtype=float),
+        df['vibration_z_g'].to_numpy(dtype=float),
+    )
+    temp_all = df['spindle_temp_c'].to_numpy(dtype=float)
+    valid = ~(np.isnan(t_all) | np.isnan(mag_all) | np.isnan(temp_all))
+    
+    for rows in df.groupby('machine_id', sort=False).indices.values():
+        rows = rows[valid[rows]]
+        if len(rows) == 0:
+            continue
+        # Pad the front with NaN so every row has a full window of which the valid part is used
+        pad = np.full(window - 1, np.nan)
+        t = np.concatenate([pad, t_all[rows] - t_all[rows].min()])
+        y = np.concatenate([pad, temp_all[rows]])
+        v2 = np.concatenate([pad, mag_all[rows] ** 2])
+        tw, yw, vw = (sliding_window_view(a, window) for a in (t, y, v2))
+        n = np.sum(~np.isnan(tw), axis=1)
+        
+        rms = np.sqrt(np.nansum(vw, axis=1) / n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            tc = tw - (np.nansum(tw, axis=1) / n)[:, None]
+            yc = yw - (np.nansum(yw, axis=1) / n)[:, None]
+            sxx = np.nansum(tc * tc, axis=1)
+            slope = np.where(sxx > 1e-9, np.nansum(tc * yc, axis=1) / np.where(sxx > 1e-9, sxx, 1.0), 0.0)
+        out[rows, 0] = rms
+        out[rows, 1] = slope
+    return out
+
+
+# Per-machine window state for online scoring (records_to_matrix), shared across requests in a process
+online_windows = WindowedFeatures()
@@ -0,0 +1,310 @@
+"""
+Incremental - Update trained models from new data windows instead of retraining on all history
+Warm-started forests with reservoir-sampled replay, and drift checks that decide when a full retrain is needed
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import joblib
+from sklearn.metrics import r2_score, mean_absolute_error
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import (
+    RANDOM_STATE, N_ESTIMATORS_REGRESSION, N_ESTIMATORS_CLASSIFICATION,
+    INCREMENTAL_RESERVOIR_SIZE, INCREMENTAL_REPLAY_RATIO, INCREMENTAL_MAX_WINDOW_ROWS,
+    INCREMENTAL_TREES_PER_UPDATE, INCREMENTAL_MAX_TREES,
+    DRIFT_PSI_THRESHOLD, DRIFT_ERROR_RATIO
+)
+
+STATE_FILE = 'incremental_state.joblib'
+
+# Error floors so a near-perfect baseline does not turn noise into drift
+MIN_ROUGHNESS_MAE = 0.01
+MIN_WEAR_ERROR = 0.02
+
+
+class Reservoir:
+    """Uniform fixed-size sample of every training row offered so far (Algorithm R, vectorized per batch)"""
+
+    def __init__(self, capacity=INCREMENTAL_RESERVOIR_SIZE, n_features=0, seed=RANDOM_STATE):
+        self.capacity = capacity
+        self.X = np.empty((capacity, n_features), dtype=np.float32)
+        self.y_roughness = np.empty(capacity)
+        self.y_wear = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, X, y_roughness, y_wear):
+        n = len(X)
+        free = min(self.capacity - self.size, n)
+        if free:
+            end = self.size + free
+            self.X[self.size:end], self.y_roughness[self.size:end], self.y_wear[self.size:end] = \
+                X[:free], y_roughness[:free], y_wear[:free]
+            self.size = end
+        if n > free:
+            # The k-th row overall (from 0) replaces a random slot with probability capacity / (k + 1)
+            rows = np.arange(free, n)
+            slots = (self.rng.random(len(rows)) * (self.seen + rows + 1)).astype(np.int64)
+            keep = slots < self.capacity
+            rows, slots = rows[keep], slots[keep]
+            self.X[slots], self.y_roughness[slots], self.y_wear[slots] = X[rows], y_roughness[rows], y_wear[rows]
+        self.seen += n
+
+    def sample(self, n):
+        """Up to `n` distinct rows as (X, y_roughness, y_wear)"""
+        idx = self.rng.choice(self.size, min(n, self.size), replace=False)
+        return self.X[idx], self.y_roughness[idx], self.y_wear[idx]
+
+    def arrays(self):
+        return self.X[:self.size], self.y_roughness[:self.size], self.y_wear[:self.size]
+
+
+def population_stability(reference_fractions, fractions):
+    """Population stability index between two binned distributions (last axis)"""
+    p = np.maximum(reference_fractions, 1e-4)
+    q = np.maximum(fractions, 1e-4)
+    return np.sum((q - p) * np.log(q / p), axis=-1)
+
+
+class DriftMonitor:
+    """Feature and error drift of new windows against the data of the last full retrain
+
+    Features are binned at reference deciles and compared with the
+    population stability index. Window errors of the current models are
+    compared with the errors measured right after the last full retrain;
+    when no baseline is known yet, the first window sets it.
+    """
+
+    def __init__(self, X_reference, roughness_mae=None, wear_error=None, bins=10,
+                 psi_threshold=DRIFT_PSI_THRESHOLD, error_ratio=DRIFT_ERROR_RATIO):
+        qs = np.linspace(0, 1, bins + 1)[1:-1]
+        self.edges = np.quantile(X_reference, qs, axis=0).T
+        self.reference = self._fractions(X_reference)
+        self.roughness_mae = roughness_mae
+        self.wear_error = wear_error
+        self.psi_threshold = psi_threshold
+        self.error_ratio = error_ratio
+
+    def _fractions(self, X):
+        n_bins = self.edges.shape[1] + 1
+        out = np.empty((X.shape[1], n_bins))
+        for j, edges in enumerate(self.edges):
+            out[j] = np.bincount(np.searchsorted(edges, X[:, j], side='right'), minlength=n_bins) / len(X)
+        return out
+
+    def check(self, X, roughness_mae, wear_error):
+        psi = population_stability(self.reference, self._fractions(X))
+        report = {'psi_max': float(psi.max()), 'psi_feature': int(psi.argmax()), 'reasons': []}
+        if report['psi_max'] > self.psi_threshold:
+            report['reasons'].append('feature_drift')
+        if self.roughness_mae is None:
+            self.roughness_mae, self.wear_error = roughness_mae, wear_error
+        report['roughness_error_ratio'] = roughness_mae / max(self.roughness_mae, MIN_ROUGHNESS_MAE)
+        report['wear_error_ratio'] = wear_error / max(self.wear_error, MIN_WEAR_ERROR)
+        if report['roughness_error_ratio'] > self.error_ratio:
+            report['reasons'].append('roughness_error')
+        if report['wear_error_ratio'] > self.error_ratio:
+            report['reasons'].append('wear_error')
+        report['drift'] = bool(report['reasons'])
+        return report
+
+
+def _forest_params(model, n_estimators):
+    params = model.get_params()
+    params.update(n_estimators=n_estimators, warm_start=False)
+    return params
+
+
+class IncrementalTrainer:
+    """Keeps the roughness and wear forests current from new data windows
+
+    Each window is first scored by the current models (a prequential
+    check), then:
+    - without drift, `trees_per_update` trees are added to each forest by
+      warm start on the window plus a replay sample from the reservoir,
+      and the oldest trees beyond `max_trees` are dropped;
+    - with drift, both forests are refit from scratch on the window plus
+      the reservoir.
+    Either way the cost depends on the window, reservoir and tree limits,
+    never on the length of the history.
+    """
+
+    def __init__(self, models, X_reference, baseline=None, reservoir=None, trained_until=None,
+                 replay_ratio=INCREMENTAL_REPLAY_RATIO, max_window_rows=INCREMENTAL_MAX_WINDOW_ROWS,
+                 trees_per_update=INCREMENTAL_TREES_PER_UPDATE, max_trees=INCREMENTAL_MAX_TREES):
+        self.models = models
+        self.reservoir = reservoir or Reservoir(n_features=X_reference.shape[1])
+        baseline = baseline or {}
+        self.monitor = DriftMonitor(X_reference, baseline.get('roughness_mae'), baseline.get('wear_error'))
+        self.trained_until = trained_until
+        self.replay_ratio = replay_ratio
+        self.max_window_rows = max_window_rows
+        self.trees_per_update = trees_per_update
+        self.max_trees = max_trees
+        self.rng = np.random.default_rng(RANDOM_STATE)
+        self.updates = 0
+        self.full_retrains = 0
+
+    @classmethod
+    def from_training(cls, models, X, y_roughness, y_wear, metrics, trained_until=None):
+        """Start from freshly trained models, their test metrics and the training rows"""
+        trainer = cls(models, X, baseline={
+            'roughness_mae': metrics.get('roughness_mae'),
+            'wear_error': 1.0 - metrics['wear_accuracy'] if 'wear_accuracy' in metrics else None,
+        }, trained_until=trained_until)
+        trainer.reservoir.add(X, y_roughness, y_wear)
+        return trainer
+
+    def score(self, X, y_roughness, y_wear):
+        """Current models' metrics on (X, y) in the CNCAnalytics metric names"""
+        pred = self.models['roughness'].predict(X)
+        return {
+            'roughness_r2': float(r2_score(y_roughness, pred)) if len(X) > 1 else float('nan'),
+            'roughness_mae': float(mean_absolute_error(y_roughness, pred)),
+            'wear_accuracy': float(np.mean(self.models['wear'].predict(X) == y_wear)),
+        }
+
+    def update(self, X, y_roughness, y_wear, trained_until=None, force_full=False):
+        """Score then learn one window of new rows; returns a report with metrics, drift and timings"""
+        if len(X) > self.max_window_rows:
+            keep = np.sort(self.rng.choice(len(X), self.max_window_rows, replace=False))
+            X, y_roughness, y_wear = X[keep], y_roughness[keep], y_wear[keep]
+        report = {'rows': len(X)}
+        report['metrics'] = self.score(X, y_roughness, y_wear)
+        report['drift'] = self.monitor.check(X, report['metrics']['roughness_mae'],
+                                             1.0 - report['metrics']['wear_accuracy'])
+
+        start = time.perf_counter()
+        if force_full or report['drift']['drift']:
+            report['mode'] = 'full'
+            self._refit(X, y_roughness, y_wear)
+        else:
+            report['mode'] = 'warm_start'
+            report['wear_skipped'] = not self._grow(X, y_roughness, y_wear)
+        report['fit_seconds'] = time.perf_counter() - start
+        report['trees'] = {name: len(model.estimators_) for name, model in self.models.items()}
+
+        self.reservoir.add(X, y_roughness, y_wear)
+        if trained_until is not None:
+            self.trained_until = trained_until
+        self.updates += 1
+        return report
+
+    def _grow(self, X, y_roughness, y_wear):
+        """Warm-start new trees on the window plus replay; returns False if the wear model was left as is"""
+        Xr, yr, yw = self.reservoir.sample(int(len(X) * self.replay_ratio))
+        X_fit = np.vstack([X, Xr])
+        targets = {'roughness': np.concatenate([y_roughness, yr]), 'wear': np.concatenate([y_wear, yw])}
+        wear_ok = np.array_equal(np.unique(targets['wear']), self.models['wear'].classes_)
+        for name, model in self.models.items():
+            if name == 'wear' and not wear_ok:
+                # New trees must see every known class or their probabilities would not line up
+                continue
+            model.set_params(warm_start=True, n_estimators=len(model.estimators_) + self.trees_per_update)
+            model.fit(X_fit, targets[name])
+            if len(model.estimators_) > self.max_trees:
+                model.estimators_ = model.estimators_[-self.max_trees:]
+            model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+        return wear_ok
+
+    def _refit(self, X, y_roughness, y_wear):
+        """Full retrain on the window plus the reservoir; the window becomes the new drift reference"""
+        Xr, yr, yw = self.reservoir.arrays()
+        X_fit = np.vstack([X, Xr])
+        fresh = {
+            'roughness': (N_ESTIMATORS_REGRESSION, np.concatenate([y_roughness, yr])),
+            'wear': (N_ESTIMATORS_CLASSIFICATION, np.concatenate([y_wear, yw])),
+        }
+        for name, (n_estimators, y) in fresh.items():
+            model = type(self.models[name])(**_forest_params(self.models[name], n_estimators))
+            self.models[name] = model.fit(X_fit, y)
+        self.monitor = DriftMonitor(X, psi_threshold=self.monitor.psi_threshold, error_ratio=self.monitor.error_ratio)
+        self.full_retrains += 1
+
+    def __getstate__(self):
+        # Models are persisted separately as the regular *_model.pkl files
+        state = dict(self.__dict__)
+        state['models'] = None
+        return state
+
+    def save(self, path):
+        joblib.dump(self, path)
+
+    @classmethod
+    def load(cls, path, models):
+        """Saved trainer state bound to `models`, or None"""
+        try:
+            trainer = joblib.load(path)
+        except (FileNotFoundError, EOFError):
+            return None
+        trainer.models = models
+        return trainer
+
+
+def benchmark(initial_rows=5000, window_rows=2500, windows=6, shift_at=None, seed=RANDOM_STATE):
+    """Update time per window against full retrains on the growing history"""
+    import pandas as pd
+    from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
+    from data.generate_dataset import synthesize
+    from analytics.features import training_arrays, FEATURE_COLUMNS
+
+    # The synthetic wear trend spans a whole dataset, so each window is a full tool life of its own
+    parts = [synthesize(rows=initial_rows, machines=4, operations=8, seed=seed)]
+    parts += [synthesize(rows=window_rows, machines=4, operations=8, seed=seed + 1 + w) for w in range(windows)]
+    X_all, yr_all, yw_all = training_arrays(pd.concat(parts, ignore_index=True))
+    if shift_at is not None:
+        # Sensor recalibration: spindle temperature reads 8 C high from this window on
+        X_all[initial_rows + shift_at * window_rows:, FEATURE_COLUMNS.index('spindle_temp_c')] += 8
+
+    def full_fit(X, yr, yw):
+        models = {
+            'roughness': RandomForestRegressor(n_estimators=N_ESTIMATORS_REGRESSION, random_state=RANDOM_STATE, n_jobs=-1),
+            'wear': RandomForestClassifier(n_estimators=N_ESTIMATORS_CLASSIFICATION, random_state=RANDOM_STATE, n_jobs=-1),
+        }
+        models['roughness'].fit(X, yr)
+        models['wear'].fit(X, yw)
+        return models
+
+    X0, yr0, yw0 = X_all[:initial_rows], yr_all[:initial_rows], yw_all[:initial_rows]
+    models = full_fit(X0, yr0, yw0)
+    trainer = IncrementalTrainer(models, X0)
+    trainer.reservoir.add(X0, yr0, yw0)
+
+    rows = []
+    for w in range(windows):
+        lo = initial_rows + w * window_rows
+        hi = lo + window_rows
+        report = trainer.update(X_all[lo:hi], yr_all[lo:hi], yw_all[lo:hi])
+        start = time.perf_counter()
+        full_fit(X_all[:hi], yr_all[:hi], yw_all[:hi])
+        rows.append({
+            'window': w + 1,
+            'history_rows': hi,
+            'mode': report['mode'],
+            'update_s': report['fit_seconds'],
+            'full_retrain_s': time.perf_counter() - start,
+            'window_r2': report['metrics']['roughness_r2'],
+            'window_acc': report['metrics']['wear_accuracy'],
+            'psi_max': report['drift']['psi_max'],
+            'reasons': ','.join(report['drift']['reasons']),
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare incremental model updates with full retrains')
+    parser.add_argument('--initial', type=int, default=5000, help='Rows in the initial full training')
+    parser.add_argument('--window', type=int, default=2500, help='Rows per update window')
+    parser.add_argument('--windows', type=int, default=6)
+    parser.add_argument('--shift-at', type=int, default=None, help='Window (from 0) at which to inject a temperature sensor shift')
+    args = parser.parse_args()
+    table = benchmark(args.initial, args.window, args.windows, args.shift_at)
+    print("🔁 Incremental updates vs full retrain on all history")
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
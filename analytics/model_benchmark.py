@@ -0,0 +1,233 @@
+"""
+Model Benchmark - Compare model families and sizes for the roughness and wear models
+Time-series cross-validation in a process pool, reporting accuracy against training time, latency and size
+"""
+import io
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import joblib
+from sklearn.ensemble import (
+    RandomForestRegressor, RandomForestClassifier,
+    HistGradientBoostingRegressor, HistGradientBoostingClassifier
+)
+from sklearn.linear_model import Ridge, LogisticRegression
+from sklearn.metrics import r2_score, mean_absolute_error, accuracy_score
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import (
+    RANDOM_STATE, PREDICTION_MAX_LATENCY_MS,
+    BENCHMARK_TREE_COUNTS, BENCHMARK_BOOSTING_ITERATIONS, BENCHMARK_CV_SPLITS,
+    BENCHMARK_WORKERS, BENCHMARK_SIZE_BUDGET_MB
+)
+from analytics.features import training_arrays
+
+TASKS = ('roughness', 'wear')
+SCORE = {'roughness': 'r2', 'wear': 'accuracy'}
+
+
+def candidates(tree_counts=BENCHMARK_TREE_COUNTS, boosting_iterations=BENCHMARK_BOOSTING_ITERATIONS):
+    """(family, params) pairs evaluated for every task"""
+    specs = [('forest', {'n_estimators': n}) for n in tree_counts]
+    specs += [('hist_gb', {'max_iter': n}) for n in boosting_iterations]
+    specs.append(('linear', {}))
+    return specs
+
+
+def build_model(task, family, params):
+    """Unfitted estimator; single-threaded because the pool runs one job per CPU"""
+    regression = task == 'roughness'
+    if family == 'forest':
+        cls = RandomForestRegressor if regression else RandomForestClassifier
+        return cls(random_state=RANDOM_STATE, n_jobs=1, **params)
+    if family == 'hist_gb':
+        cls = HistGradientBoostingRegressor if regression else HistGradientBoostingClassifier
+        return cls(random_state=RANDOM_STATE, early_stopping=False, **params)
+    if family == 'linear':
+        last = Ridge(**params) if regression else LogisticRegression(max_iter=1000, **params)
+        return make_pipeline(StandardScaler(), last)
+    raise ValueError(f"Unknown model family: {family}")
+
+
+def _best_time(fn, X, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def model_size_bytes(model):
+    """Size of the model as joblib writes it to disk"""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.getbuffer().nbytes
+
+
+# Training data, set once per worker process by _init_worker
+_DATA = {}
+
+
+def _init_worker(X, targets, n_splits):
+    _DATA['X'] = X
+    _DATA['targets'] = targets
+    _DATA['folds'] = list(TimeSeriesSplit(n_splits=n_splits).split(X))
+
+
+def evaluate(task, family, params, fold):
+    """Fit on the past of one fold and score on what follows; costs are measured on the last fold"""
+    X, y = _DATA['X'], _DATA['targets'][task]
+    train, test = _DATA['folds'][fold]
+    model = build_model(task, family, params)
+    start = time.perf_counter()
+    model.fit(X[train], y[train])
+    result = {'task': task, 'family': family, 'params': params, 'fold': fold,
+              'train_rows': len(train), 'fit_s': time.perf_counter() - start}
+
+    pred = model.predict(X[test])
+    if task == 'roughness':
+        result['r2'] = r2_score(y[test], pred)
+        result['mae'] = mean_absolute_error(y[test], pred)
+    else:
+        result['accuracy'] = accuracy_score(y[test], pred)
+
+    if fold == len(_DATA['folds']) - 1:
+        batch = X[test][:1000]
+        result['latency_1row_ms'] = _best_time(model.predict, X[test][:1], repeats=20) * 1000
+        result['batch_us_per_row'] = _best_time(model.predict, batch, repeats=3) / len(batch) * 1e6
+        result['size_mb'] = model_size_bytes(model) / 1e6
+        if family == 'forest':
+            # The edge path scores flattened forests (MODEL_BACKEND = "compiled")
+            from analytics.compiled_forest import CompiledForest
+            compiled = CompiledForest.from_sklearn(model)
+            result['compiled_1row_ms'] = _best_time(compiled.predict, X[test][:1], repeats=20) * 1000
+            result['compiled_mb'] = compiled.nbytes / 1e6
+    return result
+
+
+def _run(job):
+    return evaluate(*job)
+
+
+def run_benchmark(df, specs=None, tasks=TASKS, n_splits=BENCHMARK_CV_SPLITS, workers=BENCHMARK_WORKERS):
+    """Evaluate every (task, family, params) candidate on every fold; returns one row per candidate"""
+    specs = candidates() if specs is None else specs
+    if 'timestamp' in df.columns:
+        df = df.sort_values('timestamp', kind='stable')
+    X, y_roughness, y_wear = training_arrays(df)
+    targets = {'roughness': y_roughness, 'wear': y_wear}
+
+    # Largest jobs first so the pool does not finish on one long fit
+    jobs = [(task, family, params, fold) for task in tasks for family, params in specs for fold in range(n_splits)]
+    jobs.sort(key=lambda j: (j[1] == 'linear', -sum(j[2].values()), -j[3]))
+    if workers == 1:
+        _init_worker(X, targets, n_splits)
+        results = [_run(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(X, targets, n_splits)) as pool:
+            results = list(pool.map(_run, jobs))
+    return summarize(results)
+
+
+def summarize(results):
+    """Mean/std fold scores and total training time per candidate, with last-fold costs"""
+    rows = []
+    frame = pd.DataFrame(results)
+    frame['model'] = frame['family'] + frame['params'].map(
+        lambda p: ''.join(f' {k}={v}' for k, v in sorted(p.items())))
+    for (task, model), group in frame.groupby(['task', 'model'], sort=False):
+        score = SCORE[task]
+        last = group.loc[group['fold'].idxmax()]
+        row = {
+            'task': task,
+            'model': model,
+            'family': last['family'],
+            score: group[score].mean(),
+            f'{score}_std': group[score].std(ddof=0),
+            'fit_s': group['fit_s'].sum(),
+        }
+        if task == 'roughness':
+            row['mae'] = group['mae'].mean()
+        for column in ('latency_1row_ms', 'batch_us_per_row', 'size_mb', 'compiled_1row_ms', 'compiled_mb'):
+            if column in last and pd.notna(last[column]):
+                row[column] = last[column]
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def recommend(summary, latency_budget_ms=PREDICTION_MAX_LATENCY_MS, size_budget_mb=BENCHMARK_SIZE_BUDGET_MB):
+    """Most accurate model per task whose single-row latency and size fit the budget
+
+    Forests are judged on their compiled form when it is faster, as that
+    is what the edge scorer loads.
+    """
+    picks = {}
+    for task, group in summary.groupby('task', sort=False):
+        latency = group[['latency_1row_ms', 'compiled_1row_ms']].min(axis=1) \
+            if 'compiled_1row_ms' in group else group['latency_1row_ms']
+        size = group['size_mb']
+        if 'compiled_mb' in group:
+            size = size.where(group['compiled_1row_ms'].isna() | (group['latency_1row_ms'] <= group['compiled_1row_ms']),
+                              group['compiled_mb'])
+        fits = group[(latency <= latency_budget_ms) & (size <= size_budget_mb)]
+        if not fits.empty:
+            picks[task] = fits.loc[fits[SCORE[task]].idxmax()].to_dict()
+    return picks
+
+
+def main():
+    from analytics.analyze import CNCAnalytics
+
+    parser = argparse.ArgumentParser(description='Benchmark model families and sizes for the analytics models')
+    parser.add_argument('--dataset', default=None, help='Dataset CSV (default: settings DATASET_CSV)')
+    parser.add_argument('--trees', type=int, nargs='+', default=list(BENCHMARK_TREE_COUNTS), help='Forest sizes')
+    parser.add_argument('--iterations', type=int, nargs='+', default=list(BENCHMARK_BOOSTING_ITERATIONS),
+                        help='Gradient boosting iterations')
+    parser.add_argument('--splits', type=int, default=BENCHMARK_CV_SPLITS, help='Time-series CV folds')
+    parser.add_argument('--workers', type=int, default=BENCHMARK_WORKERS, help='Process pool size (1 runs inline)')
+    parser.add_argument('--latency-budget-ms', type=float, default=PREDICTION_MAX_LATENCY_MS)
+    parser.add_argument('--size-budget-mb', type=float, default=BENCHMARK_SIZE_BUDGET_MB)
+    parser.add_argument('--out', default=None, help='Also write the results table to this CSV')
+    args = parser.parse_args()
+
+    analytics = CNCAnalytics(args.dataset)
+    analytics.load_data()
+    start = time.perf_counter()
+    summary = run_benchmark(analytics.df, candidates(args.trees, args.iterations),
+                            n_splits=args.splits, workers=args.workers)
+    print(f"\n⏱ {len(summary)} candidates x {args.splits} folds in {time.perf_counter() - start:.1f}s")
+
+    for task, group in summary.groupby('task', sort=False):
+        score = SCORE[task]
+        columns = ['model', score, f'{score}_std', 'mae', 'fit_s', 'latency_1row_ms', 'batch_us_per_row',
+                   'size_mb', 'compiled_1row_ms', 'compiled_mb']
+        table = group[[c for c in columns if c in group]].dropna(axis=1, how='all').sort_values(score, ascending=False)
+        print(f"\n📊 {task} ({score}, fit_s summed over folds, costs from the last fold)")
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+    picks = recommend(summary, args.latency_budget_ms, args.size_budget_mb)
+    print(f"\n✅ Best within {args.latency_budget_ms:g} ms per reading and {args.size_budget_mb:g} MB:")
+    for task in summary['task'].unique():
+        pick = picks.get(task)
+        if pick is None:
+            print(f"   {task}: ⚠ no candidate fits the budget")
+        else:
+            print(f"   {task}: {pick['model']} ({SCORE[task]}={pick[SCORE[task]]:.3f})")
+    if args.out:
+        summary.to_csv(args.out, index=False)
+        print(f"\n   ✓ Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,36 +3,103 @@ Predict - Real-time predictions using trained models
 """
 import os
 import sys
+import time
+import threading
 import joblib
 import numpy as np
 
 # Add project root to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from config.settings import MODELS_DIR
+from config.settings import MODELS_DIR, MODEL_MMAP_MODE, MODEL_RELOAD_CHECK_SECONDS, MODEL_BACKEND
+from analytics.compiled_forest import CompiledForest
+from analytics.features import records_to_matrix
+
+MODEL_FILES = {
+    'roughness': 'roughness_model.pkl',
+    'wear': 'wear_model.pkl',
+}
+COMPILED_MODEL_FILES = {
+    'roughness': 'roughness_model.npz',
+    'wear': 'wear_model.npz',
+}
 
 
 class CNCPredictor:
-    """Real-time prediction engine"""
+    """Real-time prediction engine
+    
+    With `backend='compiled'` the flat CompiledForest exports are loaded
+    with `mmap_mode`, so their node arrays are mapped from the page cache
+    and shared by every worker process. The sklearn pickles cannot be
+    shared this way (unpickling a tree copies its nodes), so each process
+    holds its own copy. The model files are re-checked at most every
+    `reload_check_seconds` and reloaded when they change on disk; they are
+    always replaced atomically, so a reload never sees a partial file.
+    """
     
-    def __init__(self):
+    def __init__(self, models_path=None, mmap_mode=MODEL_MMAP_MODE,
+                 reload_check_seconds=MODEL_RELOAD_CHECK_SECONDS, backend=MODEL_BACKEND):
+        self.models_path = models_path or os.path.join(os.path.dirname(__file__), MODELS_DIR)
+        self.backend = backend
+        self.model_files = COMPILED_MODEL_FILES if backend == 'compiled' else MODEL_FILES
+        self.mmap_mode = mmap_mode
+        self.reload_check_seconds = reload_check_seconds
         self.models = {}
+        self._signature = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
         self.load_models()
     
+    def _model_signature(self):
+        """(mtime, size) of each model file, None for missing files"""
+        signature = []
+        for filename in self.model_files.values():
+            try:
+                st = os.stat(os.path.join(self.models_path, filename))
+                signature.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+    
     def load_models(self):
         """Load trained models"""
-        models_path = os.path.join(os.path.dirname(__file__), MODELS_DIR)
-        
+        signature = self._model_signature()
         try:
-            self.models['roughness'] = joblib.load(os.path.join(models_path, 'roughness_model.pkl'))
-            self.models['wear'] = joblib.load(os.path.join(models_path, 'wear_model.pkl'))
+            if self.backend == 'compiled':
+                models = {
+                    name: CompiledForest.load(os.path.join(self.models_path, filename), mmap_mode=self.mmap_mode)
+                    for name, filename in self.model_files.items()
+                }
+            else:
+                models = {
+                    name: joblib.load(os.path.join(self.models_path, filename))
+                    for name, filename in self.model_files.items()
+                }
             print("✓ Models loaded successfully")
         except FileNotFoundError:
             print("⚠ Models not found. Run analytics/analyze.py first to train models.")
-            self.models = {}
+            models = {}
+        # Swap in one assignment so concurrent predictions see old or new models, never a mix
+        self.models = models
+        self._signature = signature
+        self._next_check = time.monotonic() + self.reload_check_seconds
+    
+    def maybe_reload(self):
+        """Reload the models if their files changed since the last load"""
+        if time.monotonic() < self._next_check:
+            return False
+        with self._reload_lock:
+            if time.monotonic() < self._next_check:
+                return False
+            self._next_check = time.monotonic() + self.reload_check_seconds
+            if self._model_signature() == self._signature:
+                return False
+            self.load_models()
+            return True
     
     def predict_roughness(self, features):
         """Predict surface roughness"""
+        self.maybe_reload()
         if 'roughness' not in self.models:
             return None
         
@@ -42,21 +109,94 @@ class CNCPredictor:
     
     def predict_wear(self, features):
         """Predict tool wear state (0=new, 1=medium, 2=worn)"""
+        self.maybe_reload()
         if 'wear' not in self.models:
             return None
         
-        X = np.array([features])
-        prediction = self.models['wear'].predict(X)[0]
-        probabilities = self.models['wear'].predict_proba(X)[0]
+        states, confidences = self.predict_wear_batch(np.array([features]))
         
         return {
-            'wear_state': int(prediction),
-            'confidence': float(probabilities[prediction])
+            'wear_state': int(states[0]),
+            'confidence': float(confidences[0])
         }
+    
+    def predict_wear_batch(self, X, model=None):
+        """Wear states and confidences for a feature matrix from one predict_proba pass"""
+        model = model if model is not None else self.models['wear']
+        probabilities = model.predict_proba(X)
+        best = probabilities.argmax(axis=1)
+        return model.classes_[best], probabilities[np.arange(len(best)), best]
+    
+    def predict_batch(self, X):
+        """
+        Score many readings at once
+        
+        Args:
+            X: (n_readings, n_features) array in features.MODEL_COLUMNS order
+        
+        Returns:
+            dict of arrays (None when the model is not loaded)
+        """
+        self.maybe_reload()
+        models = self.models
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        result = {'surface_roughness_um': None, 'wear_state': None, 'confidence': None}
+        if len(X) == 0:
+            return result
+        if 'roughness' in models:
+            result['surface_roughness_um'] = models['roughness'].predict(X)
+        if 'wear' in models:
+            result['wear_state'], result['confidence'] = self.predict_wear_batch(X, models['wear'])
+        return result
 
 
-# Singleton instance
-predictor = CNCPredictor()
+# Singleton instance, created on first use rather than at import time
+_predictor = None
+_predictor_lock = threading.Lock()
+
+
+def get_predictor():
+    """Return the shared CNCPredictor, loading the models on the first call"""
+    global _predictor
+    if _predictor is None:
+        with _predictor_lock:
+            if _predictor is None:
+                _predictor = CNCPredictor()
+    return _predictor
+
+
+def __getattr__(name):
+    # Keeps `from analytics.predict import predictor` working without an import-time load
+    if name == 'predictor':
+        return get_predictor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def format_predictions(result, n):
+    """Turn predict_batch arrays for `n` readings into per-reading prediction dicts"""
+    roughness = result['surface_roughness_um']
+    out = []
+    for i in range(n):
+        wear = None
+        if result['wear_state'] is not None:
+            wear = {
+                'wear_state': int(result['wear_state'][i]),
+                'confidence': float(result['confidence'][i])
+            }
+        out.append({
+            'surface_roughness_um': float(roughness[i]) if roughness is not None else None,
+            'tool_wear': wear
+        })
+    return out
+
+
+def predict_from_telemetry_batch(readings):
+    """Make predictions for many telemetry dicts with one model pass each"""
+    if not readings:
+        return []
+    return format_predictions(get_predictor().predict_batch(records_to_matrix(readings).X), len(readings))
 
 
 def predict_from_telemetry(telemetry):
@@ -69,27 +209,7 @@ def predict_from_telemetry(telemetry):
     Returns:
         dict with predictions
     """
-    # Extract features in correct order
-    features = [
-        telemetry.get('spindle_speed_rpm', 5000),
-        telemetry.get('feed_rate_mm_min', 800),
-        telemetry.get('vibration_x_g', 0.5),
-        telemetry.get('vibration_y_g', 0.5),
-        telemetry.get('vibration_z_g', 0.5),
-        telemetry.get('spindle_temp_c', 60),
-        telemetry.get('motor_temp_c', 50),
-        telemetry.get('cutting_force_n', 400),
-        telemetry.get('acoustic_emission_ae', 5),
-        telemetry.get('power_consumption_kw', 5),
-    ]
-    
-    roughness = predictor.predict_roughness(features)
-    wear = predictor.predict_wear(features)
-    
-    return {
-        'surface_roughness_um': roughness,
-        'tool_wear': wear
-    }
+    return predict_from_telemetry_batch([telemetry])[0]
 
 
 if __name__ == "__main__":
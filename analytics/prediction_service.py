@@ -0,0 +1,123 @@
+"""
+Prediction Service - Micro-batching front end for CNCPredictor
+Merges concurrent single-reading requests into batches within a latency budget
+"""
+import os
+import sys
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import PREDICTION_MAX_BATCH, PREDICTION_MAX_LATENCY_MS
+from analytics.predict import get_predictor, format_predictions
+from analytics.features import records_to_matrix
+
+
+class MicroBatchPredictor:
+    """Collects readings from many threads and scores them together
+
+    The worker waits at most `max_latency_ms` after the first queued
+    reading, or until `max_batch` readings are queued, then runs one
+    batched model pass and resolves every caller's Future.
+    """
+
+    def __init__(self, predictor=None, max_batch=PREDICTION_MAX_BATCH,
+                 max_latency_ms=PREDICTION_MAX_LATENCY_MS, latency_window=10000):
+        self.predictor = predictor or get_predictor()
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1000.0
+        self._queue = queue.Queue()
+        self._latencies = deque(maxlen=latency_window)
+        self._stats_lock = threading.Lock()
+        self.readings_scored = 0
+        self.batches = 0
+        self.started_at = time.perf_counter()
+        self._stopped = False
+        self._worker = threading.Thread(target=self._run, name='prediction-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, telemetry):
+        """Queue one telemetry dict; returns a Future resolving to its prediction dict"""
+        future = Future()
+        self._queue.put((telemetry, future, time.perf_counter()))
+        return future
+
+    def predict(self, telemetry, timeout=None):
+        """Blocking single-reading prediction through the batcher"""
+        return self.submit(telemetry).result(timeout)
+
+    def predict_many(self, readings):
+        """Score a caller-supplied batch directly, bypassing the queue"""
+        t0 = time.perf_counter()
+        result = format_predictions(self.predictor.predict_batch(records_to_matrix(readings).X), len(readings))
+        self._record([time.perf_counter() - t0] * len(readings))
+        return result
+
+    def _record(self, latencies):
+        with self._stats_lock:
+            self._latencies.extend(latencies)
+            self.readings_scored += len(latencies)
+            self.batches += 1
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch or latency budget is full"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first[2] + self.max_latency
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=max(0.0, remaining)) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopped = True
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._stopped:
+            batch = self._collect()
+            if batch is None:
+                break
+            readings = [item[0] for item in batch]
+            try:
+                result = format_predictions(self.predictor.predict_batch(records_to_matrix(readings).X), len(readings))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            for (_, future, submitted), prediction in zip(batch, result):
+                future.set_result(prediction)
+            self._record([done - submitted for _, _, submitted in batch])
+
+    def close(self):
+        """Stop the worker after the queued readings are scored"""
+        self._queue.put(None)
+        self._worker.join()
+
+    def stats(self):
+        """Throughput and latency percentiles (milliseconds) over the recent window"""
+        with self._stats_lock:
+            latencies = np.array(self._latencies) * 1000.0
+            scored, batches = self.readings_scored, self.batches
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            'readings_scored': scored,
+            'batches': batches,
+            'mean_batch_size': scored / batches if batches else 0.0,
+            'throughput_per_s': scored / elapsed if elapsed > 0 else 0.0,
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        }
@@ -12,6 +12,9 @@ DATA_SEED = 42
 # File Paths
 DATASET_CSV = "data/digital_twin_cnc_operation.csv"
 TELEMETRY_CSV = "data/telemetry.csv"
+DATASET_STORE_DIR = "data/store/operations"
+TELEMETRY_STORE_DIR = "data/store/telemetry"
+STORAGE_BACKEND = "csv"  # "csv" or "parquet" (requires pyarrow)
 REPORT_OUTPUT_DIR = "reports/output"
 MODELS_DIR = "analytics/models"
 
@@ -20,12 +23,48 @@ DASHBOARD_HOST = "127.0.0.1"
 DASHBOARD_PORT = 5000
 DASHBOARD_DEBUG = True
 REFRESH_INTERVAL_SECONDS = 2
+DASHBOARD_CACHE_ROWS_PER_MACHINE = 500
+STREAM_POLL_INTERVAL_SECONDS = 0.5
+STREAM_MAX_ROWS_PER_EVENT = 50
+STREAM_MAX_CLIENTS = 4  # open /api/stream clients per process (each holds a thread); more get 503 and poll instead
+SERIES_DEFAULT_MAX_POINTS = 1000
+SERIES_MAX_POINTS_LIMIT = 20000
+SERIES_MAX_ROWS_PER_MACHINE = 100_000  # readings /api/series keeps in memory per machine; older ranges are read from the store
+DASHBOARD_SERVER = "dev"  # "dev" (Flask) or "production" (preforked gunicorn workers)
+DASHBOARD_WORKERS = 4
+DASHBOARD_THREADS = 8
+DASHBOARD_COMPRESSION_MIN_BYTES = 1024  # gzip JSON responses at least this large; 0 disables
 
 # ML Model Settings
 TEST_SIZE = 0.25
 RANDOM_STATE = 42
 N_ESTIMATORS_REGRESSION = 120
 N_ESTIMATORS_CLASSIFICATION = 150
+TRAINING_MODE = "full"  # "full" retrains on all history; "incremental" updates saved models from new rows
+FEATURE_WINDOWED = False  # also train/score on rolling vibration RMS and temperature slope per machine
+FEATURE_WINDOW_READINGS = 30
+FEATURE_SPECTRAL = False  # also train/score on each machine's latest vibration spectrum (analytics.spectral)
+MODEL_BACKEND = "sklearn"  # "sklearn" pickles or "compiled" flat NumPy forests
+MODEL_MMAP_MODE = "r"  # mmap_mode for compiled model arrays (shared across workers); None reads them into memory
+MODEL_RELOAD_CHECK_SECONDS = 2.0
+PREDICTION_MAX_BATCH = 256
+PREDICTION_MAX_LATENCY_MS = 5
+
+# Incremental Training
+INCREMENTAL_RESERVOIR_SIZE = 20000  # uniform sample of all history kept for replay and full retrains
+INCREMENTAL_REPLAY_RATIO = 1.0  # replayed reservoir rows per new row in each update
+INCREMENTAL_MAX_WINDOW_ROWS = 20000  # larger windows are subsampled
+INCREMENTAL_TREES_PER_UPDATE = 20
+INCREMENTAL_MAX_TREES = 300  # oldest trees are dropped beyond this
+DRIFT_PSI_THRESHOLD = 0.25  # population stability index of any feature against the last full retrain
+DRIFT_ERROR_RATIO = 1.5  # window error relative to the error at the last full retrain
+
+# Model Benchmark
+BENCHMARK_TREE_COUNTS = (25, 50, 100, 150, 300)
+BENCHMARK_BOOSTING_ITERATIONS = (50, 100, 200)
+BENCHMARK_CV_SPLITS = 4  # TimeSeriesSplit folds; every fold trains on the past and tests on what follows
+BENCHMARK_WORKERS = None  # process pool size; None uses every CPU
+BENCHMARK_SIZE_BUDGET_MB = 25  # with PREDICTION_MAX_LATENCY_MS, the edge scoring budget
 
 # Alert Thresholds
 VIBRATION_THRESHOLD_G = 1.2
@@ -35,12 +74,53 @@ SPINDLE_TEMP_WARNING_C = 70
 SURFACE_ROUGHNESS_TOLERANCE_UM = 0.8
 RUL_WARNING_MINUTES = 15
 
+# Alert Rules: (name, "metric op threshold [for duration]", severity); thresholds may name settings above
+ALERT_RULES = [
+    ('spindle_temp_warning', 'spindle_temp_c > SPINDLE_TEMP_WARNING_C for 30s', 'warning'),
+    ('spindle_temp_critical', 'spindle_temp_c > SPINDLE_TEMP_CRITICAL_C', 'critical'),
+    ('vibration_high', 'vibration_g > VIBRATION_THRESHOLD_G for 10s', 'warning'),
+    ('cutting_force_high', 'cutting_force_n > CUTTING_FORCE_THRESHOLD_N for 10s', 'warning'),
+    ('surface_roughness_out_of_tolerance', 'surface_roughness_ra_um > SURFACE_ROUGHNESS_TOLERANCE_UM', 'warning'),
+    ('rul_low', 'remaining_useful_life_min < RUL_WARNING_MINUTES', 'critical'),
+]
+ALERT_COOLDOWN_SECONDS = 60  # a rule re-raised for the same machine within this window is suppressed
+ALERT_MAX_PER_MINUTE = 120  # fleet-wide cap on raised alerts (by reading time)
+ALERT_HISTORY = 1000
+
+# Streaming Detection
+CHATTER_EXIT_RATIO = 0.85  # chatter ends once vibration falls below threshold * ratio
+ANOMALY_EWMA_ALPHA = 0.05
+ANOMALY_Z_ENTER = 4.0
+ANOMALY_Z_EXIT = 2.0
+ANOMALY_WARMUP_SAMPLES = 30
+ANOMALY_MIN_STD_G = 0.02
+
+# Spectral Analysis
+VIBRATION_SAMPLE_RATE_HZ = 10000
+SPECTRAL_NPERSEG = 1024
+SPECTRAL_OVERLAP = 0.5
+SPECTRAL_AVERAGING = 0.3  # weight of the newest Welch estimate in each machine's running PSD
+SPECTRAL_BANDS_HZ = ((0, 500), (500, 2000), (2000, 5000))
+
 # Pipeline Simulation
 DEFAULT_SIMULATION_ITERATIONS = 300
 DEFAULT_SIMULATION_DELAY = 0.03
+SIMULATOR_MACHINES = 1000
+SIMULATOR_TARGET_RATE = 5000  # aggregate readings/s across the virtual fleet
+SIMULATOR_JITTER = 0.1  # +/- fraction of each machine's sampling period
+SIMULATOR_RATE_SPREAD = 0.5  # lognormal sigma of per-machine rates
+SIMULATOR_BATCH_INTERVAL_SECONDS = 0.02
+COLLECTOR_FLUSH_ROWS = 1000
+COLLECTOR_FLUSH_INTERVAL_SECONDS = 1.0
+COLLECTOR_FSYNC = False
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
 MQTT_TOPIC_PATTERN = "cnc/+/telemetry"
+INGEST_QUEUE_MESSAGES = 10000  # raw MQTT payloads waiting to be decoded
+INGEST_WRITE_QUEUE_BATCHES = 8  # decoded batches waiting to be written
+INGEST_BATCH_ROWS = 5000
+INGEST_BATCH_INTERVAL_SECONDS = 0.5
+INGEST_OVERFLOW = "block"  # "block" (backpressure to the broker) or "drop"
 
 # Report Settings
 REPORT_TITLE = "CNC Machine Digital Twin Analysis Report"
@@ -48,3 +128,6 @@ REPORT_AUTHOR = "Digital Twin System"
 FIGURE_DPI = 100
 FIGURE_SIZE_WIDE = (10, 4)
 FIGURE_SIZE_STANDARD = (8, 3)
+FIGURE_MAX_POINTS = 2000
+REPORT_FIGURE_WORKERS = 3
+FLEET_REPORT_WORKERS = 4
@@ -5,7 +5,10 @@ Real-time monitoring and analytics dashboard
 import os
 import sys
 import json
-from flask import Flask, render_template, jsonify
+import gzip
+import threading
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
+import numpy as np
 import pandas as pd
 import plotly
 import plotly.graph_objs as go
@@ -16,23 +19,59 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from config.settings import (
     DASHBOARD_HOST, DASHBOARD_PORT, DASHBOARD_DEBUG,
-    DATASET_CSV, TELEMETRY_CSV,
+    DASHBOARD_CACHE_ROWS_PER_MACHINE, DATASET_CSV, TELEMETRY_CSV,
+    STREAM_POLL_INTERVAL_SECONDS, STREAM_MAX_ROWS_PER_EVENT, STREAM_MAX_CLIENTS,
+    SERIES_DEFAULT_MAX_POINTS, SERIES_MAX_POINTS_LIMIT, SERIES_MAX_ROWS_PER_MACHINE,
+    DASHBOARD_SERVER, DASHBOARD_COMPRESSION_MIN_BYTES,
     VIBRATION_THRESHOLD_G, SPINDLE_TEMP_CRITICAL_C,
     SURFACE_ROUGHNESS_TOLERANCE_UM
 )
+from dashboard.data_cache import TailingCSVCache
+from data.store import dataset_store, use_parquet
+from dashboard.live_stream import TelemetryBroadcaster
+from analytics.aggregates import KPIAggregator
+from dashboard.series_index import SeriesIndex
+from analytics.alerts import AlertEngine
+from analytics.spectral import spectral_engine, spectral_columns
 
 app = Flask(__name__)
 
+# Shared across requests; only newly appended rows are parsed on each poll
+data_cache = TailingCSVCache(
+    os.path.join(os.path.dirname(__file__), '..', DATASET_CSV),
+    rows_per_machine=DASHBOARD_CACHE_ROWS_PER_MACHINE
+)
+
+# Fleet KPIs over the whole history, updated from each batch the cache parses
+kpi_aggregator = KPIAggregator()
+data_cache.add_listener(kpi_aggregator.update_frame, kpi_aggregator.reset)
+
+
+def load_series_history(machine, start_ns, end_ns):
+    """Readings of one machine for [start_ns, end_ns] from the Parquet store, if there is one"""
+    if not (use_parquet() and dataset_store().exists()):
+        return None
+    start = None if start_ns is None else pd.Timestamp(start_ns, unit='ns', tz='UTC')
+    end = None if end_ns is None else pd.Timestamp(end_ns, unit='ns', tz='UTC') + pd.Timedelta(microseconds=1)
+    return dataset_store().read(machines=machine, start=start, end=end)
+
+
+# Recent-history time index for /api/series, fed the same way; older ranges come from the store
+series_index = SeriesIndex(max_rows_per_machine=SERIES_MAX_ROWS_PER_MACHINE, history=load_series_history)
+data_cache.add_listener(series_index.append_frame, series_index.reset)
+
+# Threshold/duration alert rules from settings, evaluated on each parsed batch
+alert_engine = AlertEngine()
+data_cache.add_listener(alert_engine.update_frame, alert_engine.reset)
+
 
 def load_latest_data(limit=100):
     """Load most recent telemetry data"""
-    dataset_path = os.path.join(os.path.dirname(__file__), '..', DATASET_CSV)
-    
-    if os.path.exists(dataset_path):
-        df = pd.read_csv(dataset_path, parse_dates=['timestamp'])
-        df = df.sort_values('timestamp', ascending=False).head(limit)
-        return df
-    return None
+    df = data_cache.latest(limit)
+    if df is None and use_parquet():
+        # No CSV to tail; fall back to the newest rows of the Parquet store
+        df = dataset_store().latest(limit)
+    return df
 
 
 def create_spindle_chart(df):
@@ -168,6 +207,51 @@ def calculate_kpis(df):
     }
 
 
+def current_kpis(df=None):
+    """Running fleet KPIs; falls back to calculate_kpis(df) when the cache has seen no rows"""
+    data_cache.refresh()
+    kpis = kpi_aggregator.kpis()
+    if kpis['total_records'] == 0:
+        return calculate_kpis(df) if df is not None and not df.empty else None
+    return kpis
+
+
+# Single producer shared by every /api/stream client
+broadcaster = TelemetryBroadcaster(
+    data_cache, current_kpis,
+    interval=STREAM_POLL_INTERVAL_SECONDS,
+    max_rows=STREAM_MAX_ROWS_PER_EVENT,
+    max_subscribers=STREAM_MAX_CLIENTS
+)
+
+
+# Last gzipped body per ETag, so an unchanged snapshot is compressed once
+_gzip_memo = {'last': (None, None)}
+
+
+@app.after_request
+def compress_response(response):
+    """Gzip large JSON responses for clients that accept it"""
+    if (DASHBOARD_COMPRESSION_MIN_BYTES <= 0 or response.status_code != 200
+            or response.is_streamed or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '')):
+        return response
+    body = response.get_data()
+    if len(body) < DASHBOARD_COMPRESSION_MIN_BYTES:
+        return response
+    etag = response.get_etag()[0]
+    memo_etag, compressed = _gzip_memo['last']
+    if etag is None or memo_etag != etag:
+        compressed = gzip.compress(body, compresslevel=6)
+        if etag is not None:
+            _gzip_memo['last'] = (etag, compressed)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
 @app.route('/')
 def index():
     """Main dashboard page with 3D simulation"""
@@ -180,35 +264,220 @@ def index_2d():
     return render_template('dashboard.html')
 
 
+# Encoded /api/data snapshot for the most recent data version served
+_snapshot = {'version': None, 'body': None}
+_snapshot_lock = threading.Lock()
+
+
+def data_version():
+    """Position token of the tailed dataset, or None when it is not being tailed
+
+    Derived from the file itself, so every worker process reports the same
+    token for the same content.
+    """
+    data_cache.refresh()
+    return data_cache.position if data_cache.columns is not None else None
+
+
+def build_snapshot(df, version=None):
+    """Full dashboard payload: KPIs, figure JSON and the newest raw rows"""
+    # Convert dataframe to list of dicts for 3D simulation
+    raw_data = df.head(50).to_dict('records')
+    
+    return {
+        'version': version,
+        'kpis': current_kpis(df),
+        'charts': {
+            'spindle': create_spindle_chart(df),
+            'temperature': create_temperature_chart(df),
+            'vibration': create_vibration_chart(df),
+            'quality': create_quality_chart(df)
+        },
+        'raw_data': raw_data,  # Add raw data for 3D simulation
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def _json_values(series):
+    return json.loads(series.to_json(orient='values', date_format='iso'))
+
+
+def chart_deltas(rows):
+    """Points to prepend to trace 0 of each dashboard figure for `rows` (newest first)"""
+    ts = _json_values(rows['timestamp'])
+    vib_mag = (rows['vibration_x_g']**2 + rows['vibration_y_g']**2 + rows['vibration_z_g']**2)**0.5
+    return {
+        'spindle': {'x': [ts], 'y': [_json_values(rows['spindle_speed_rpm'])]},
+        'temperature': {'x': [ts], 'y': [_json_values(rows['spindle_temp_c'])]},
+        'vibration': {'x': [ts], 'y': [_json_values(vib_mag)]},
+        'quality': {'x': [_json_values(rows['surface_roughness_ra_um'])]},
+    }
+
+
+def data_delta(since, version):
+    """Rows appended after the `since` cursor, newest first, with per-figure trace updates and current KPIs"""
+    if since == version:
+        return not_modified(f'data-{version}')
+    rows = data_cache.appended_since_position(since)
+    if rows is None:
+        return jsonify({'resync': True, 'version': version})
+    rows = rows.tail(50).iloc[::-1]
+    # Same row encoding as the SSE 'rows' event
+    body = '{"version": %s, "kpis": %s, "charts": %s, "raw_data": %s}' % (
+        json.dumps(version), json.dumps(current_kpis()), json.dumps(chart_deltas(rows)),
+        rows.to_json(orient='records', date_format='iso'))
+    return Response(body, mimetype='application/json')
+
+
 @app.route('/api/data')
 def get_data():
-    """API endpoint for dashboard data"""
+    """API endpoint for dashboard data
+
+    Figures are encoded once per data version and served with an ETag, so
+    unchanged data costs a 304. With `?since=<version>` only the rows
+    appended after that cursor are returned.
+    """
     try:
-        df = load_latest_data(limit=200)
+        version = data_version()
+        if version is None:
+            # Not tailing a CSV (Parquet store only): build every time
+            df = load_latest_data(limit=200)
+            if df is None or df.empty:
+                return jsonify({'error': 'No data available. Generate dataset first.'}), 404
+            return jsonify(build_snapshot(df))
         
-        if df is None or df.empty:
-            return jsonify({'error': 'No data available. Generate dataset first.'}), 404
+        since = request.args.get('since')
+        if since is not None:
+            return data_delta(since, version)
         
-        # Convert dataframe to list of dicts for 3D simulation
-        raw_data = df.head(50).to_dict('records')
+        etag = f'data-{version}'
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
         
-        data = {
-            'kpis': calculate_kpis(df),
-            'charts': {
-                'spindle': create_spindle_chart(df),
-                'temperature': create_temperature_chart(df),
-                'vibration': create_vibration_chart(df),
-                'quality': create_quality_chart(df)
-            },
-            'raw_data': raw_data,  # Add raw data for 3D simulation
-            'timestamp': datetime.utcnow().isoformat()
-        }
+        with _snapshot_lock:
+            if _snapshot['version'] != version:
+                df = load_latest_data(limit=200)
+                if df is None or df.empty:
+                    return jsonify({'error': 'No data available. Generate dataset first.'}), 404
+                _snapshot['body'] = app.json.dumps(build_snapshot(df, version))
+                _snapshot['version'] = version
+            body = _snapshot['body']
         
-        return jsonify(data)
+        response = Response(body, mimetype='application/json')
+        # Weak: the same version is served gzipped or identity-encoded
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({'error': f'Error processing data: {str(e)}'}), 500
 
 
+@app.route('/api/series')
+def get_series():
+    """Downsampled history of one metric for one machine
+
+    Query: machine, metric, optional from/to (ISO time, inclusive) and
+    max_points. Min/max downsampling bounds the payload for any range.
+    """
+    machine = request.args.get('machine')
+    metric = request.args.get('metric')
+    if not machine or not metric:
+        return jsonify({'error': 'machine and metric are required'}), 400
+    max_points = request.args.get('max_points', SERIES_DEFAULT_MAX_POINTS, type=int)
+    max_points = min(max(max_points, 4), SERIES_MAX_POINTS_LIMIT)
+    
+    if data_version() is None and use_parquet():
+        # Not tailing a CSV: index the Parquet store once
+        with _snapshot_lock:
+            if not len(series_index) and dataset_store().exists():
+                series_index.append_frame(dataset_store().read())
+    
+    try:
+        series = series_index.query(machine, metric, request.args.get('from'), request.args.get('to'), max_points)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid time range: {str(e)}'}), 400
+    if series is None:
+        return jsonify({'error': f'Unknown machine or metric: {machine}, {metric}'}), 404
+    return jsonify(series)
+
+
+@app.route('/api/alerts')
+def get_alerts():
+    """Active alerts plus alerts raised or resolved since sequence number `since`"""
+    data_cache.refresh()
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', 200, type=int), 1), 1000)
+    return jsonify(alert_engine.snapshot(since, limit))
+
+
+@app.route('/api/spectrum', methods=['GET', 'POST'])
+def spectrum():
+    """Vibration spectra from high-rate sample streams
+
+    POST {"machine_id": ..., "samples": [[x...], [y...], [z...]]} (or a
+    list of those) feeds this process's SpectralEngine, which also backs
+    the spectral model features. GET returns the dominant frequency and
+    band energies of every machine; with `machine` also its PSD summed
+    over axes.
+    """
+    engine = spectral_engine()
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        chunks = body if isinstance(body, list) else [body]
+        frames = 0
+        for chunk in chunks:
+            try:
+                samples = np.asarray(chunk['samples'], dtype=float)
+                machine = chunk['machine_id']
+            except (KeyError, TypeError, ValueError) as e:
+                return jsonify({'error': f'Invalid samples: {str(e)}'}), 400
+            if samples.ndim != 2 or samples.shape[0] != engine.axes:
+                return jsonify({'error': f'samples must be {engine.axes} equal-length axis arrays'}), 400
+            frames += engine.push([machine], samples[None])
+        return jsonify({'frames': frames})
+
+    features = engine.features()
+    machines = [
+        {'machine_id': machine, **{name: float(features[name][i]) for name in spectral_columns(engine.bands)}}
+        for i, machine in enumerate(features['machine_id'])
+    ]
+    payload = {'sample_rate_hz': engine.sample_rate, 'machines': machines}
+    machine = request.args.get('machine')
+    if machine is not None:
+        result = engine.spectrum(machine)
+        if result is None:
+            return jsonify({'error': f'No spectrum for machine: {machine}'}), 404
+        freqs, psd = result
+        payload.update(machine=machine, freqs=freqs.tolist(), psd=psd.sum(axis=0).tolist())
+    return jsonify(payload)
+
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events stream of new telemetry rows and changed KPIs
+
+    Each open stream holds a request thread, so past STREAM_MAX_CLIENTS
+    per process this returns 503 and the page polls /api/data?since=.
+    """
+    q = broadcaster.subscribe()
+    if q is None:
+        return jsonify({'error': 'Too many live streams; poll /api/data?since= instead'}), 503
+    response = Response(
+        stream_with_context(broadcaster.stream(q)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Frees the slot even if the stream is closed before it starts
+    response.call_on_close(lambda: broadcaster.unsubscribe(q))
+    return response
+
+
 @app.route('/api/status')
 def status():
     """System status endpoint"""
@@ -219,12 +488,20 @@ def status():
         'status': 'operational',
         'dataset_available': os.path.exists(dataset_path),
         'telemetry_available': os.path.exists(telemetry_path),
+        'store_available': use_parquet() and dataset_store().exists(),
         'timestamp': datetime.utcnow().isoformat()
     })
 
 
-def run_dashboard():
-    """Start the dashboard server"""
+def run_dashboard(production=None):
+    """Start the dashboard server (Flask dev server, or gunicorn workers in production mode)"""
+    if production is None:
+        production = DASHBOARD_SERVER == 'production'
+    if production:
+        from dashboard.serve import serve
+        serve()
+        return
+    
     print("="*60)
     print("CNC DIGITAL TWIN - DASHBOARD")
     print("="*60)
@@ -0,0 +1,201 @@
+"""
+Data Cache - Incremental tail reader for the telemetry dataset
+Keeps the latest records per machine in memory and only parses newly appended bytes
+"""
+import io
+import os
+import threading
+from collections import deque
+
+import pandas as pd
+
+
+class TailingCSVCache:
+    """Shared in-process cache over an append-only CSV file
+
+    Tracks the file size, mtime and inode between refreshes. Appended bytes
+    are parsed once and pushed into a fixed-size ring buffer per machine, so
+    a refresh costs O(new rows). A shrunk, replaced or rewritten file (the
+    bytes already read no longer match) is re-read from the start.
+    """
+
+    # Bytes compared at the start of the file and just before the read offset
+    SIGNATURE_BYTES = 4096
+
+    def __init__(self, path, rows_per_machine=500, machine_column='machine_id',
+                 time_column='timestamp', block_bytes=64 * 1024 * 1024, history_rows=100_000):
+        self.path = path
+        self.rows_per_machine = rows_per_machine
+        self.history_rows = history_rows
+        self.machine_column = machine_column
+        self.time_column = time_column
+        self.block_bytes = block_bytes
+        self._lock = threading.Lock()
+        self._listeners = []
+        # Bumped on every re-read and never rewound, unlike `version`
+        self.generation = 0
+        self._reset()
+
+    def add_listener(self, on_rows, on_reset=None):
+        """Call `on_rows(df)` for every parsed batch and `on_reset()` when the file is re-read"""
+        self._listeners.append((on_rows, on_reset))
+
+    def _reset(self):
+        self.columns = None
+        self.offset = 0
+        self.size = -1
+        self.mtime = None
+        self.inode = None
+        self.signature = None
+        self.generation += 1
+        self.version = 0
+        self.buffers = {}
+        self.appended = deque()
+        self.appended_rows = 0
+        self._frame = None
+        for _, on_reset in getattr(self, '_listeners', ()):
+            if on_reset is not None:
+                on_reset()
+
+    def _parse(self, text):
+        """Parse complete CSV lines (without header) into a DataFrame"""
+        parse_dates = [self.time_column] if self.time_column in self.columns else None
+        return pd.read_csv(io.StringIO(text), names=self.columns, header=None, parse_dates=parse_dates)
+
+    def _ingest(self, df, start, end, record=True):
+        if df.empty:
+            return
+        cols = list(df.columns)
+        machine_idx = cols.index(self.machine_column)
+        for row in df.itertuples(index=False, name=None):
+            buf = self.buffers.get(row[machine_idx])
+            if buf is None:
+                buf = self.buffers[row[machine_idx]] = deque(maxlen=self.rows_per_machine)
+            buf.append(row)
+        self.version += 1
+        if record:
+            # Recent appends for delta readers, bounded by rows (oldest batches dropped first)
+            self.appended.append((self.version, start, end, df))
+            self.appended_rows += len(df)
+            while self.appended and self.appended_rows > self.history_rows:
+                self.appended_rows -= len(self.appended.popleft()[3])
+        self._frame = None
+        for on_rows, _ in self._listeners:
+            on_rows(df)
+
+    def _signature(self, f, offset):
+        """Head of the file and the bytes ending at `offset`; changes when consumed content is rewritten"""
+        f.seek(0)
+        head = f.read(min(offset, self.SIGNATURE_BYTES))
+        tail_start = max(len(head), offset - self.SIGNATURE_BYTES)
+        f.seek(tail_start)
+        return head, f.read(offset - tail_start)
+
+    def _rewritten(self, st):
+        """True if the file was rewritten in place since the last refresh (same inode, not just appended)"""
+        if self.signature is None or st.st_mtime_ns == self.mtime:
+            return False
+        if st.st_size <= self.size:
+            # Modified without growing: not an append
+            return True
+        with open(self.path, 'rb') as f:
+            return self._signature(f, self.offset) != self.signature
+
+    def refresh(self):
+        """Read any bytes appended since the last call; returns True if new rows arrived"""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if self.size != -1:
+                    self._reset()
+                return False
+
+            if st.st_ino != self.inode or st.st_size < self.offset or self._rewritten(st):
+                # File was replaced, truncated or rewritten: start over
+                self._reset()
+                self.inode = st.st_ino
+            elif st.st_size == self.size and st.st_mtime_ns == self.mtime:
+                return False
+
+            before = self.version
+            # The initial read is not an append; delta readers start from a snapshot taken after it
+            backfill = self.columns is None
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                if self.columns is None:
+                    header = f.readline()
+                    if not header.endswith(b'\n'):
+                        return False
+                    self.columns = header.decode('utf-8').strip().split(',')
+                    self.offset = f.tell()
+                while True:
+                    block = f.read(self.block_bytes)
+                    if not block:
+                        break
+                    # Only consume complete lines; a partially written row is picked up next time
+                    end = block.rfind(b'\n')
+                    if end < 0:
+                        break
+                    self._ingest(self._parse(block[:end + 1].decode('utf-8')), self.offset, self.offset + end + 1,
+                                 record=not backfill)
+                    self.offset += end + 1
+                    if end + 1 < len(block):
+                        f.seek(self.offset)
+                self.signature = self._signature(f, self.offset)
+
+            self.size = st.st_size
+            self.mtime = st.st_mtime_ns
+            return self.version != before
+
+    def latest(self, limit=100):
+        """Most recent `limit` records across all machines, newest first"""
+        self.refresh()
+        with self._lock:
+            if self.columns is None:
+                return None
+            if self._frame is None:
+                rows = [row for buf in self.buffers.values() for row in buf]
+                frame = pd.DataFrame.from_records(rows, columns=self.columns)
+                if self.time_column in frame.columns:
+                    frame = frame.sort_values(self.time_column, ascending=False, kind='stable')
+                self._frame = frame.reset_index(drop=True)
+            return self._frame.head(limit)
+
+    def appended_since(self, version):
+        """Rows appended after `version`, oldest first
+
+        Returns None when the rows are no longer retained (the caller is
+        too far behind, or the file was re-read) and must resynchronise.
+        """
+        with self._lock:
+            if version == self.version:
+                return pd.DataFrame(columns=self.columns or [])
+            if version > self.version or not self.appended or self.appended[0][0] > version + 1:
+                return None
+            batches = [df for v, _, _, df in self.appended if v > version]
+            return pd.concat(batches, ignore_index=True) if len(batches) > 1 else batches[0]
+
+    @property
+    def position(self):
+        """Content position token ("<inode>-<offset>"), identical in every process tailing the file"""
+        return f'{self.inode or 0:x}-{self.offset}'
+
+    def appended_since_position(self, position):
+        """Like appended_since, but keyed by a `position` token
+
+        Returns None unless a retained batch starts exactly at that offset
+        of the same file (processes may split the appends differently).
+        """
+        with self._lock:
+            if position == self.position:
+                return pd.DataFrame(columns=self.columns or [])
+            inode, _, offset = str(position).partition('-')
+            if inode != f'{self.inode or 0:x}' or not offset.isdigit():
+                return None
+            offset = int(offset)
+            batches = [(start, df) for _, start, end, df in self.appended if end > offset]
+            if not batches or batches[0][0] != offset:
+                return None
+            frames = [df for _, df in batches]
+            return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
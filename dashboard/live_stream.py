@@ -0,0 +1,127 @@
+"""
+Live Stream - Server-Sent Events fan-out for dashboard clients
+One producer thread watches the data cache and pushes pre-encoded events to every subscriber
+"""
+import json
+import queue
+import threading
+import time
+
+
+def format_event(event, data, event_id=None):
+    """Encode a single Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+
+class TelemetryBroadcaster:
+    """Polls a TailingCSVCache and fans new rows and changed KPIs out to subscribers
+
+    Each event is serialised once and the same string is queued for every
+    client. The producer thread only runs while someone is subscribed.
+    Every open stream holds a server thread for its lifetime, so at most
+    `max_subscribers` are accepted (None for no limit).
+    """
+
+    def __init__(self, cache, kpi_fn, interval=0.5, max_rows=50,
+                 queue_size=100, keepalive=15.0, max_subscribers=None):
+        self.cache = cache
+        self.kpi_fn = kpi_fn
+        self.interval = interval
+        self.max_rows = max_rows
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._generation = None
+        self._version = None
+        self._kpis = None
+
+    def subscribe(self):
+        """Register a new client and return its event queue, or None when full"""
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(q)
+            if self._kpis is not None:
+                q.put_nowait(format_event('kpis', json.dumps(self._kpis), self._version))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='telemetry-broadcaster', daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, message):
+        """Queue an encoded message for every subscriber"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # Slow client: drop its backlog and ask it to reload a full snapshot
+                while not q.empty():
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        break
+                q.put_nowait(format_event('resync', '{}', self._version))
+
+    def poll(self):
+        """Check the cache once and publish anything new"""
+        self.cache.refresh()
+        generation, version = self.cache.generation, self.cache.version
+        if (generation, version) == (self._generation, self._version):
+            return
+        # A re-read file restarts the version count, so only the same generation can be diffed
+        same_file = generation == self._generation
+        previous, self._generation, self._version = self._version, generation, version
+
+        if previous is not None:
+            rows = self.cache.appended_since(previous) if same_file else None
+            if rows is None:
+                self.publish(format_event('resync', '{}', version))
+            elif not rows.empty:
+                # Newest first, like /api/data raw_data
+                rows = rows.tail(self.max_rows).iloc[::-1]
+                self.publish(format_event('rows', rows.to_json(orient='records', date_format='iso'), version))
+
+        kpis = self.kpi_fn()
+        if kpis is not None and kpis != self._kpis:
+            self._kpis = kpis
+            self.publish(format_event('kpis', json.dumps(kpis), version))
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠ Live stream poll failed: {e}")
+            time.sleep(self.interval)
+
+    def stream(self, q=None):
+        """Generator of SSE text for one client (queue from subscribe()); unsubscribes when the client disconnects"""
+        q = q if q is not None else self.subscribe()
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    yield q.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(q)
@@ -0,0 +1,146 @@
+"""
+Load Test - Dashboard throughput against worker count
+Starts the production server with 1..N workers and measures requests/sec from concurrent clients
+"""
+import os
+import sys
+import time
+import json
+import socket
+import argparse
+import subprocess
+import http.client
+from multiprocessing import Pool
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import DASHBOARD_HOST, DASHBOARD_THREADS
+
+# Weighted request mix: wall displays mostly revalidate, engineers pull history
+REQUEST_MIX = (
+    ('/api/data', 4),
+    ('/api/data?since={version}', 4),
+    ('/api/series?machine={machine}&metric=spindle_temp_c&max_points=1000', 2),
+    ('/api/status', 1),
+)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind((DASHBOARD_HOST, 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(DASHBOARD_HOST, port, timeout=2)
+            conn.request('GET', '/api/status')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def _client(job):
+    """One client process: keep-alive requests for `duration` seconds"""
+    port, duration, paths = job
+    conn = http.client.HTTPConnection(DASHBOARD_HOST, port, timeout=30)
+    headers = {'Accept-Encoding': 'gzip'}
+    latencies = []
+    errors = 0
+    i = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        path = paths[i % len(paths)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(DASHBOARD_HOST, port, timeout=30)
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+    return latencies, errors
+
+
+def _request_paths(port):
+    conn = http.client.HTTPConnection(DASHBOARD_HOST, port, timeout=30)
+    conn.request('GET', '/api/data')
+    snapshot = json.loads(conn.getresponse().read())
+    conn.close()
+    version = snapshot.get('version') or ''
+    machine = snapshot['raw_data'][0]['machine_id'] if snapshot.get('raw_data') else 'CNC-01'
+    paths = []
+    for template, weight in REQUEST_MIX:
+        paths.extend([template.format(version=version, machine=machine)] * weight)
+    return paths
+
+
+def run_level(workers, threads, clients, duration):
+    """Throughput and latency with `workers` server processes"""
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(__file__), 'serve.py'),
+         '--host', DASHBOARD_HOST, '--port', str(port),
+         '--workers', str(workers), '--threads', str(threads), '--quiet'],
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        if not _wait_ready(port):
+            raise RuntimeError(f"Server with {workers} workers did not start")
+        paths = _request_paths(port)
+        with Pool(clients) as pool:
+            results = pool.map(_client, [(port, duration, paths[i:] + paths[:i]) for i in range(clients)])
+    finally:
+        server.terminate()
+        server.wait()
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    n = len(latencies)
+    return {
+        'workers': workers,
+        'requests': n,
+        'errors': errors,
+        'rps': n / duration,
+        'p50_ms': latencies[n // 2] * 1000 if n else 0.0,
+        'p99_ms': latencies[min(n - 1, int(n * 0.99))] * 1000 if n else 0.0,
+    }
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Measure dashboard requests/sec as worker processes scale')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, max(1, cores // 2), cores}),
+                        help='Worker counts to test')
+    parser.add_argument('--threads', type=int, default=DASHBOARD_THREADS)
+    parser.add_argument('--clients', type=int, default=max(4, 2 * cores), help='Concurrent client processes')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per worker count')
+    args = parser.parse_args()
+
+    print("="*60)
+    print("CNC DIGITAL TWIN - DASHBOARD LOAD TEST")
+    print("="*60)
+    print(f"   cores={cores} clients={args.clients} threads/worker={args.threads} duration={args.duration}s\n")
+    print(f"   {'workers':>7} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    baseline = None
+    for workers in args.workers:
+        r = run_level(workers, args.threads, args.clients, args.duration)
+        baseline = baseline or r['rps']
+        print(f"   {r['workers']:>7} {r['rps']:>9.1f} {r['rps'] / baseline:>7.2f}x "
+              f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>7}")
+    print("="*60)
+
+
+if __name__ == '__main__':
+    main()
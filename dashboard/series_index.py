@@ -0,0 +1,259 @@
+"""
+Series Index - Time-indexed per-machine telemetry with min/max pyramids
+Answers machine/metric/time-range queries with binary search and bounded-size downsampling
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# Numeric telemetry columns that can be queried; vibration magnitude is derived
+SERIES_METRICS = (
+    'spindle_speed_rpm', 'feed_rate_mm_min',
+    'x_axis_position', 'y_axis_position', 'z_axis_position',
+    'vibration_x_g', 'vibration_y_g', 'vibration_z_g', 'vibration_magnitude_g',
+    'spindle_temp_c', 'motor_temp_c', 'cutting_force_n',
+    'acoustic_emission_ae', 'power_consumption_kw',
+    'tool_wear_state', 'surface_roughness_ra_um',
+    'chatter_detected', 'remaining_useful_life_min',
+)
+
+
+def _epoch_ns(values):
+    ts = pd.DatetimeIndex(pd.to_datetime(values, utc=True)).tz_convert(None)
+    return ts.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+
+def _grow(buffer, needed, fill=None):
+    """`buffer` with capacity for at least `needed` items, doubling so appends are amortised O(1)"""
+    if len(buffer) >= needed:
+        return buffer
+    grown = np.empty(max(needed, 2 * len(buffer), 64), dtype=buffer.dtype)
+    if fill is not None:
+        grown[len(buffer):] = fill
+    grown[:len(buffer)] = buffer
+    return grown
+
+
+class MachineSeries:
+    """Sorted timestamps and metric columns for one machine
+
+    Columns live in capacity-doubling buffers. Each metric keeps a pyramid
+    of (argmin, argmax) index arrays; level L summarises blocks of
+    2**(L+1) readings, and appends only recompute each level's trailing
+    blocks, so indexing costs O(new rows). At most `max_rows` recent
+    readings are kept: past that the oldest quarter is dropped (and the
+    pyramids rebuilt), and `truncated` tells callers that older ranges
+    must come from elsewhere.
+    """
+
+    def __init__(self, max_rows=None):
+        self.max_rows = max_rows
+        self.n = 0
+        self._t = np.empty(0, dtype=np.int64)
+        self._values = {}
+        self._levels = {}
+        self._built = {}
+        self._pending = []
+        self.truncated = False
+
+    @property
+    def t(self):
+        return self._t[:self.n]
+
+    def values(self, name):
+        return self._values[name][:self.n]
+
+    def __contains__(self, name):
+        return name in self._values
+
+    def append(self, t, columns):
+        self._pending.append((t, columns))
+
+    def _compact(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        t = np.concatenate([t for t, _ in pending])
+        names = {name for _, cols in pending for name in cols} | set(self._values)
+        columns = {name: np.concatenate([cols.get(name, np.full(len(bt), np.nan)) for bt, cols in pending])
+                   for name in names}
+        if np.any(np.diff(t) < 0) or (self.n and len(t) and t[0] < self._t[self.n - 1]):
+            # Out-of-order data: merge and sort everything, then rebuild the pyramids
+            t = np.concatenate([self.t, t])
+            columns = {name: np.concatenate([self._values[name][:self.n] if name in self._values
+                                             else np.full(self.n, np.nan), v]) for name, v in columns.items()}
+            order = np.argsort(t, kind='stable')
+            t, columns = t[order], {name: v[order] for name, v in columns.items()}
+            self.n, self._built = 0, {}
+
+        start, end = self.n, self.n + len(t)
+        self._t = _grow(self._t, end)
+        self._t[start:end] = t
+        for name, v in columns.items():
+            if name not in self._values:
+                self._values[name] = np.full(max(end, 64), np.nan)
+            self._values[name] = _grow(self._values[name], end, fill=np.nan)
+            self._values[name][start:end] = v
+        self.n = end
+
+        if self.max_rows and self.n > self.max_rows:
+            # Keep the newest three quarters so trimming (and the rebuild it forces) is amortised
+            keep = self.max_rows * 3 // 4
+            drop = self.n - keep
+            self._t[:keep] = self._t[drop:self.n]
+            for buffer in self._values.values():
+                buffer[:keep] = buffer[drop:self.n]
+            self.n, self._built, self.truncated = keep, {}, True
+
+        for name in self._values:
+            self._extend_pyramid(name)
+
+    def _extend_pyramid(self, name):
+        """Recompute only the trailing (possibly partial) block of every level"""
+        values = self._values[name]
+        old_n, n = self._built.get(name, 0), self.n
+        levels = self._levels.setdefault(name, [])
+        prev_lo = prev_hi = None  # level -1 is the identity
+        prev_len, prev_old = n, old_n
+        level = 0
+        while prev_len > 1:
+            length, old_len = (prev_len + 1) // 2, (prev_old + 1) // 2
+            if level == len(levels):
+                levels.append([np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)])
+            lo_buf = levels[level][0] = _grow(levels[level][0], length)
+            hi_buf = levels[level][1] = _grow(levels[level][1], length)
+            k = np.arange(max(old_len - 1, 0), length)
+            a, b = 2 * k, np.minimum(2 * k + 1, prev_len - 1)
+            if prev_lo is None:
+                lo_a = hi_a = a
+                lo_b = hi_b = b
+            else:
+                lo_a, lo_b, hi_a, hi_b = prev_lo[a], prev_lo[b], prev_hi[a], prev_hi[b]
+            lo_buf[k] = np.where(values[lo_a] <= values[lo_b], lo_a, lo_b)
+            hi_buf[k] = np.where(values[hi_a] >= values[hi_b], hi_a, hi_b)
+            prev_lo, prev_hi = lo_buf[:length], hi_buf[:length]
+            prev_len, prev_old = length, old_len
+            level += 1
+        del levels[level:]
+        self._built[name] = n
+
+    def query(self, metric, start=None, end=None, max_points=1000):
+        """Indices of the points to return for [start, end] (epoch ns), at most ~max_points"""
+        self._compact()
+        if metric not in self._values:
+            return None, 0
+        t = self.t
+        i = 0 if start is None else int(np.searchsorted(t, start, side='left'))
+        j = len(t) if end is None else int(np.searchsorted(t, end, side='right'))
+        n = j - i
+        if n <= max_points:
+            return np.arange(i, j), n
+
+        values = self.values(metric)
+        levels = self._levels[metric]
+        # Smallest block size whose min/max pairs (plus the two edge blocks) fit
+        level = 0
+        while level < len(levels) - 1 and 2 * (n // (2 << level) + 2) > max_points:
+            level += 1
+        block = 2 << level
+        b0, b1 = i // block, (j - 1) // block
+        lo, hi = levels[level]
+        parts = [lo[b0 + 1:b1], hi[b0 + 1:b1]]
+        # Edge blocks only partly overlap the range: take their extremes from the raw slice
+        for a, b in {(i, min(j, (b0 + 1) * block)), (max(i, b1 * block), j)}:
+            if b > a:
+                chunk = values[a:b]
+                parts.append(np.array([a + int(np.argmin(chunk)), a + int(np.argmax(chunk))]))
+        return np.unique(np.concatenate(parts)), n
+
+
+class SeriesIndex:
+    """Per-machine time index over the telemetry dataset
+
+    Fed incrementally from TailingCSVCache batches (or loaded from the
+    Parquet store) and queried by machine, metric and time range. Each
+    machine keeps at most `max_rows_per_machine` recent readings; ranges
+    reaching back past them are answered from `history(machine, start,
+    end)`, a DataFrame loader (e.g. the Parquet store), when one is given.
+    """
+
+    def __init__(self, metrics=SERIES_METRICS, machine_column='machine_id', time_column='timestamp',
+                 max_rows_per_machine=None, history=None):
+        self.metrics = metrics
+        self.machine_column = machine_column
+        self.time_column = time_column
+        self.max_rows_per_machine = max_rows_per_machine
+        self.history = history
+        self._lock = threading.Lock()
+        self.machines = {}
+
+    def reset(self):
+        with self._lock:
+            self.machines = {}
+
+    def __len__(self):
+        return len(self.machines)
+
+    def append_frame(self, df):
+        """Index a batch of readings (any machine order)"""
+        if df is None or len(df) == 0:
+            return
+        t = _epoch_ns(df[self.time_column])
+        columns = {name: df[name].to_numpy(dtype=float) for name in self.metrics if name in df.columns}
+        if 'vibration_magnitude_g' in self.metrics and 'vibration_x_g' in columns:
+            columns['vibration_magnitude_g'] = np.sqrt(
+                columns['vibration_x_g'] ** 2 + columns['vibration_y_g'] ** 2 + columns['vibration_z_g'] ** 2
+            )
+        with self._lock:
+            for machine, rows in df.groupby(self.machine_column, sort=False).indices.items():
+                series = self.machines.get(machine)
+                if series is None:
+                    series = self.machines[machine] = MachineSeries(self.max_rows_per_machine)
+                series.append(t[rows], {name: v[rows] for name, v in columns.items()})
+
+    def _before_window(self, machine, start_ns):
+        """True if readings before `start_ns` were dropped from the machine's window"""
+        with self._lock:
+            series = self.machines.get(machine)
+            if series is None:
+                return False
+            series._compact()
+            return series.truncated and (start_ns is None or start_ns < series.t[0])
+
+    def query(self, machine, metric, start=None, end=None, max_points=1000):
+        """Downsampled series for one machine and metric; None if unknown
+
+        `start`/`end` are anything pd.Timestamp accepts (inclusive). Min/max
+        downsampling keeps every peak and trough, so at most about
+        `max_points` points come back regardless of the range.
+        """
+        start_ns = None if start is None else _epoch_ns([start])[0]
+        end_ns = None if end is None else _epoch_ns([end])[0]
+        if self.history is not None and self._before_window(machine, start_ns):
+            # The range starts before the retained readings: index it from the history source
+            archive = SeriesIndex(self.metrics, self.machine_column, self.time_column)
+            archive.append_frame(self.history(machine, start_ns, end_ns))
+            series = archive.query(machine, metric, start_ns, end_ns, max_points)
+            if series is not None:
+                return series
+        with self._lock:
+            series = self.machines.get(machine)
+            if series is None:
+                return None
+            idx, count = series.query(metric, start_ns, end_ns, max_points)
+            if idx is None:
+                return None
+            t = series.t[idx]
+            y = series.values(metric)[idx]
+        stamps = np.datetime_as_string(t.astype('datetime64[ns]'), unit='ms')
+        return {
+            'machine': machine,
+            'metric': metric,
+            'count': count,
+            'points': len(idx),
+            'downsampled': len(idx) < count,
+            't': [s + 'Z' for s in stamps],
+            'y': y.tolist(),
+        }
@@ -0,0 +1,91 @@
+"""
+Serve - Production server for the dashboard
+Preforked gunicorn workers that share the warmed telemetry cache, with threaded request handling
+"""
+import os
+import sys
+import argparse
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import DASHBOARD_HOST, DASHBOARD_PORT, DASHBOARD_WORKERS, DASHBOARD_THREADS
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+
+def gunicorn_available():
+    return BaseApplication is not None
+
+
+def warm(dashboard):
+    """Parse the dataset and build KPI and series state in the master, before forking"""
+    dashboard.data_cache.refresh()
+    dashboard.load_latest_data(limit=200)
+
+
+if BaseApplication is not None:
+    class DashboardServer(BaseApplication):
+        """Embedded gunicorn application serving an already-imported Flask app"""
+
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+
+def serve(host=DASHBOARD_HOST, port=DASHBOARD_PORT, workers=DASHBOARD_WORKERS, threads=DASHBOARD_THREADS,
+          quiet=False):
+    """Run the dashboard with `workers` preforked processes of `threads` threads each"""
+    if not gunicorn_available():
+        raise RuntimeError("gunicorn is not installed (pip install gunicorn); use DASHBOARD_SERVER = 'dev'")
+
+    from dashboard import app as dashboard
+    # Preload: the cache, KPI aggregates and series index are built once here
+    # and inherited copy-on-write by every worker
+    warm(dashboard)
+
+    if not quiet:
+        print("="*60)
+        print("CNC DIGITAL TWIN - DASHBOARD (production)")
+        print("="*60)
+        print(f"\n🌐 http://{host}:{port}  workers={workers} threads={threads}")
+        print("="*60)
+
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': workers,
+        'threads': threads,
+        # Threaded workers; each open /api/stream client still holds one thread, so
+        # streams are capped at STREAM_MAX_CLIENTS per worker to leave threads for other requests
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'keepalive': 5,
+        'loglevel': 'warning' if quiet else 'info',
+    }
+    DashboardServer(dashboard.app, options).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the dashboard with preforked gunicorn workers')
+    parser.add_argument('--host', default=DASHBOARD_HOST)
+    parser.add_argument('--port', type=int, default=DASHBOARD_PORT)
+    parser.add_argument('--workers', type=int, default=DASHBOARD_WORKERS)
+    parser.add_argument('--threads', type=int, default=DASHBOARD_THREADS)
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.threads, args.quiet)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Store - Columnar telemetry storage on Parquet
+Hive-partitioned by machine_id and day, with column projection and time-range pushdown
+"""
+import os
+import sys
+import uuid
+import hashlib
+import shutil
+import argparse
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    ds = None
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import DATASET_CSV, DATASET_STORE_DIR, TELEMETRY_STORE_DIR, STORAGE_BACKEND
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def parquet_available():
+    return pa is not None
+
+
+def _utc(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+class TelemetryStore:
+    """Parquet dataset partitioned as <root>/machine_id=<id>/day=<YYYY-MM-DD>/part-*.parquet
+
+    Every `append` writes new files, so writers never rewrite existing data.
+    Reads prune whole partitions by machine and day before touching any
+    file, and push the exact time-range filter down to row groups.
+    """
+
+    def __init__(self, root, time_column='timestamp', machine_column='machine_id'):
+        if pa is None:
+            raise ImportError("pyarrow is required for the Parquet store (pip install pyarrow)")
+        self.root = root
+        self.time_column = time_column
+        self.machine_column = machine_column
+        self.partitioning = ds.partitioning(
+            pa.schema([(machine_column, pa.string()), ('day', pa.string())]),
+            flavor='hive'
+        )
+
+    def exists(self):
+        if not os.path.isdir(self.root):
+            return False
+        for _, _, files in os.walk(self.root):
+            if any(name.endswith('.parquet') for name in files):
+                return True
+        return False
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def append(self, df):
+        """Write a batch of rows; timestamps may be strings or datetimes"""
+        if df is None or len(df) == 0:
+            return 0
+        df = pd.DataFrame(df)
+        ts = pd.to_datetime(df[self.time_column], utc=True)
+        df[self.time_column] = ts
+        df['day'] = ts.dt.strftime('%Y-%m-%d')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        os.makedirs(self.root, exist_ok=True)
+        ds.write_dataset(
+            table, self.root,
+            format='parquet',
+            partitioning=self.partitioning,
+            basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore',
+        )
+        return len(df)
+
+    def dataset(self):
+        return ds.dataset(self.root, format='parquet', partitioning=self.partitioning)
+
+    def _filter(self, machines=None, start=None, end=None):
+        expr = None
+
+        def both(a, b):
+            return b if a is None else a & b
+
+        if machines is not None:
+            if isinstance(machines, str):
+                machines = [machines]
+            expr = both(expr, ds.field(self.machine_column).isin(list(machines)))
+        if start is not None:
+            start = _utc(start)
+            expr = both(expr, ds.field('day') >= start.strftime('%Y-%m-%d'))
+            expr = both(expr, ds.field(self.time_column) >= pa.scalar(start.to_pydatetime(), pa.timestamp('ns', 'UTC')))
+        if end is not None:
+            end = _utc(end)
+            expr = both(expr, ds.field('day') <= end.strftime('%Y-%m-%d'))
+            expr = both(expr, ds.field(self.time_column) < pa.scalar(end.to_pydatetime(), pa.timestamp('ns', 'UTC')))
+        return expr
+
+    def days(self):
+        """Sorted list of day partitions present in the store"""
+        days = set()
+        if os.path.isdir(self.root):
+            for machine_dir in os.listdir(self.root):
+                path = os.path.join(self.root, machine_dir)
+                if os.path.isdir(path):
+                    days.update(d.split('=', 1)[1] for d in os.listdir(path) if d.startswith('day='))
+        return sorted(days)
+
+    def latest(self, limit=100, columns=None):
+        """Newest `limit` rows (newest first), reading day partitions backwards until enough are found"""
+        frames = []
+        found = 0
+        dataset = None
+        for day in reversed(self.days()):
+            dataset = dataset or self.dataset()
+            cols = columns and [self.time_column] + [c for c in columns if c != self.time_column]
+            table = dataset.to_table(columns=cols, filter=ds.field('day') == day)
+            frames.append(table.drop_columns(['day']) if 'day' in table.column_names else table)
+            found += table.num_rows
+            if found >= limit:
+                break
+        if not frames:
+            return None
+        df = pa.concat_tables(frames).to_pandas()
+        return df.sort_values(self.time_column, ascending=False, kind='stable').head(limit).reset_index(drop=True)
+
+    def read(self, columns=None, machines=None, start=None, end=None):
+        """Load rows as a DataFrame sorted by time
+
+        Args:
+            columns: columns to load (None for all); the time column is always included
+            machines: machine id or list of ids to keep
+            start, end: half-open time range [start, end)
+        """
+        if not self.exists():
+            return None
+        dataset = self.dataset()
+        if columns is not None:
+            columns = [self.time_column] + [c for c in columns if c != self.time_column]
+        else:
+            columns = [name for name in dataset.schema.names if name != 'day']
+        table = dataset.to_table(columns=columns, filter=self._filter(machines, start, end))
+        df = table.to_pandas()
+        return df.sort_values(self.time_column, kind='stable').reset_index(drop=True)
+
+
+def dataset_store():
+    return TelemetryStore(os.path.join(PROJECT_ROOT, DATASET_STORE_DIR))
+
+
+def telemetry_store():
+    return TelemetryStore(os.path.join(PROJECT_ROOT, TELEMETRY_STORE_DIR))
+
+
+def use_parquet():
+    """True when settings select the Parquet backend and pyarrow is installed"""
+    return STORAGE_BACKEND == 'parquet' and parquet_available()
+
+
+def load_dataset_frame(csv_path, columns=None, machines=None, start=None, end=None):
+    """Load the operations dataset from the Parquet store when enabled, else from CSV"""
+    if use_parquet():
+        store = dataset_store()
+        if store.exists():
+            return store.read(columns=columns, machines=machines, start=start, end=end)
+    usecols = None
+    if columns is not None:
+        usecols = ['timestamp'] + [c for c in columns if c != 'timestamp']
+        if machines is not None and 'machine_id' not in usecols:
+            usecols.append('machine_id')
+    df = pd.read_csv(csv_path, parse_dates=['timestamp'], usecols=usecols)
+    if machines is not None:
+        df = df[df['machine_id'].isin([machines] if isinstance(machines, str) else machines)]
+    if start is not None:
+        df = df[df['timestamp'] >= _utc(start)]
+    if end is not None:
+        df = df[df['timestamp'] < _utc(end)]
+    return df
+
+
+def file_sha256(path, block_bytes=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_bytes), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dataset_hash(csv_path):
+    """Content hash of the dataset that load_dataset_frame would read"""
+    if use_parquet():
+        store = dataset_store()
+        if store.exists():
+            digest = hashlib.sha256()
+            for dirpath, _, files in sorted(os.walk(store.root)):
+                for name in sorted(files):
+                    if name.endswith('.parquet'):
+                        path = os.path.join(dirpath, name)
+                        digest.update(os.path.relpath(path, store.root).encode())
+                        digest.update(file_sha256(path).encode())
+            return 'parquet:' + digest.hexdigest()
+    return 'csv:' + file_sha256(csv_path)
+
+
+def migrate_csv(csv_path, store, chunksize=500_000):
+    """One-time CSV -> Parquet migration, streamed in chunks"""
+    store.clear()
+    total = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        total += store.append(chunk)
+    return total
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Migrate a telemetry CSV into the Parquet store')
+    ap.add_argument('--csv', default=os.path.join(PROJECT_ROOT, DATASET_CSV))
+    ap.add_argument('--store', default=os.path.join(PROJECT_ROOT, DATASET_STORE_DIR))
+    ap.add_argument('--chunksize', type=int, default=500_000)
+    args = ap.parse_args()
+
+    written = migrate_csv(args.csv, TelemetryStore(args.store), chunksize=args.chunksize)
+    print(f"Migrated {written} rows from {args.csv} into {args.store}")
+
+
+if __name__ == '__main__':
+    main()
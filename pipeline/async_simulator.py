@@ -0,0 +1,335 @@
+"""
+Async Simulator - Plant-scale telemetry load generator
+Thousands of virtual machines with their own rates, jitter and wear state, held to a target aggregate rate
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import (
+    DATASET_CSV, MQTT_BROKER, MQTT_PORT, SIMULATOR_MACHINES, SIMULATOR_TARGET_RATE, SIMULATOR_JITTER,
+    SIMULATOR_RATE_SPREAD, SIMULATOR_BATCH_INTERVAL_SECONDS, NUM_OPERATIONS
+)
+from data.generate_dataset import COLUMNS, derive_physics
+from pipeline.collector import TelemetryCollector, FIELDNAMES
+
+# Dataset column -> collector (publisher) field
+COLLECTOR_COLUMNS = {
+    'timestamp': 'timestamp',
+    'machine_id': 'machine_id',
+    'spindle_speed_rpm': 'spindle_rpm',
+    'feed_rate_mm_min': 'feed_rate',
+    'x_axis_position': 'axis_x_pos',
+    'y_axis_position': 'axis_y_pos',
+    'z_axis_position': 'axis_z_pos',
+    'power_consumption_kw': 'spindle_power',
+    'vibration_x_g': 'vib_x',
+    'vibration_y_g': 'vib_y',
+    'vibration_z_g': 'vib_z',
+}
+
+
+def iso_ms(epoch_seconds):
+    """Epoch seconds -> ISO-8601 strings with milliseconds and trailing Z"""
+    ms = np.round(np.asarray(epoch_seconds) * 1000).astype(np.int64).astype('datetime64[ms]')
+    return np.char.add(np.datetime_as_string(ms, unit='ms'), 'Z')
+
+
+def to_payloads(batch):
+    """Dataset-schema readings -> publisher-style payload dicts (as make_telemetry_payload)"""
+    rows = batch[list(COLLECTOR_COLUMNS)].rename(columns=COLLECTOR_COLUMNS).to_dict('records')
+    return [{
+        'ts': r['timestamp'],
+        'machine_id': r['machine_id'],
+        'spindle_rpm': r['spindle_rpm'],
+        'feed_rate': r['feed_rate'],
+        'axis_x_pos': r['axis_x_pos'],
+        'axis_y_pos': r['axis_y_pos'],
+        'axis_z_pos': r['axis_z_pos'],
+        'spindle_power': r['spindle_power'],
+        'vibration': {'x': r['vib_x'], 'y': r['vib_y'], 'z': r['vib_z']},
+    } for r in rows]
+
+
+class VirtualFleet:
+    """Vectorized state of many simulated machines
+
+    Each machine has its own sampling rate (log-normally spread, scaled so
+    the rates sum to `target_rate`), its current operation set-points and
+    tool wear. Wear advances with every reading and resets on a tool change;
+    the dependent readings come from `derive_physics`, the same
+    correlations the batch dataset uses.
+    """
+
+    def __init__(self, machines=SIMULATOR_MACHINES, target_rate=SIMULATOR_TARGET_RATE,
+                 jitter=SIMULATOR_JITTER, rate_spread=SIMULATOR_RATE_SPREAD,
+                 operations=NUM_OPERATIONS, seed=42):
+        self.rng = np.random.default_rng(seed)
+        rng = self.rng
+        width = max(2, len(str(machines)))
+        self.machine_ids = np.array([f"CNC-{i + 1:0{width}d}" for i in range(machines)], dtype=object)
+        self.operation_ids = np.array([f"OP-{j + 1:03d}" for j in range(operations)], dtype=object)
+
+        weights = rng.lognormal(0.0, rate_spread, machines)
+        self.rates = target_rate * weights / weights.sum()
+        self.periods = 1.0 / self.rates
+        self.jitter = jitter
+        self.target_rate = target_rate
+
+        # Operation set-points; each machine runs one operation for a few hundred readings
+        self.op_rpm = np.clip(rng.normal(5000, 1200, operations), 800, 12000)
+        self.op_feed = np.clip(rng.normal(800, 250, operations), 100, 2000)
+        self.operation = rng.integers(0, operations, machines)
+        self.op_remaining = rng.integers(50, 500, machines)
+
+        # Tool wear progress 0..1, staggered so the fleet is not in lockstep
+        self.wear = rng.random(machines)
+        self.wear_per_reading = 1.0 / rng.uniform(2_000, 20_000, machines)
+        self.tool_changes = 0
+
+    def __len__(self):
+        return len(self.machine_ids)
+
+    def next_intervals(self, idx):
+        """Sampling interval for the next reading of each machine in `idx`"""
+        return self.periods[idx] * (1.0 + self.jitter * self.rng.uniform(-1.0, 1.0, len(idx)))
+
+    def step(self, idx, epoch_seconds):
+        """One reading for each machine in `idx` (unique) at the given times"""
+        rng = self.rng
+        n = len(idx)
+        ops = self.operation[idx]
+        spindle_speed_rpm = np.clip(rng.normal(self.op_rpm[ops], 150).astype(np.int64), 800, 12000)
+        feed_rate_mm_min = np.clip(rng.normal(self.op_feed[ops], 40), 100, 2000)
+        x_axis_position = np.round(rng.uniform(0, 200, n), 3)
+        y_axis_position = np.round(rng.uniform(0, 200, n), 3)
+        z_axis_position = np.round(-rng.uniform(0, 20, n), 3)
+
+        wear_score = self.wear[idx] + 0.1 * rng.random(n)
+        tool_wear_state = np.digitize(wear_score, [0.33, 0.66]).astype(np.int64)
+        physics = derive_physics(rng, spindle_speed_rpm, feed_rate_mm_min, wear_score)
+
+        # Advance state: wear accumulates until a tool change, operations rotate
+        self.wear[idx] += self.wear_per_reading[idx]
+        worn = idx[self.wear[idx] >= 1.0]
+        self.wear[worn] = 0.0
+        self.tool_changes += len(worn)
+        self.op_remaining[idx] -= 1
+        done = idx[self.op_remaining[idx] <= 0]
+        self.operation[done] = rng.integers(0, len(self.operation_ids), len(done))
+        self.op_remaining[done] = rng.integers(50, 500, len(done))
+
+        frame = {
+            'timestamp': iso_ms(epoch_seconds).astype(object),
+            'machine_id': self.machine_ids[idx],
+            'operation_id': self.operation_ids[ops],
+            'spindle_speed_rpm': spindle_speed_rpm,
+            'feed_rate_mm_min': feed_rate_mm_min,
+            'x_axis_position': x_axis_position,
+            'y_axis_position': y_axis_position,
+            'z_axis_position': z_axis_position,
+            'tool_wear_state': tool_wear_state,
+        }
+        frame.update(physics)
+        return pd.DataFrame(frame, columns=COLUMNS)
+
+
+class NullSink:
+    """Discards readings; measures the generator on its own"""
+
+    def write(self, batch):
+        pass
+
+    def close(self):
+        pass
+
+
+class CollectorSink:
+    """Feeds readings to a TelemetryCollector (telemetry CSV or Parquet store)"""
+
+    def __init__(self, collector=None):
+        self.collector = collector or TelemetryCollector()
+
+    def write(self, batch):
+        rows = batch[list(COLLECTOR_COLUMNS)].rename(columns=COLLECTOR_COLUMNS)
+        self.collector.add_rows(rows[FIELDNAMES].to_dict('records'))
+
+    def close(self):
+        self.collector.close()
+
+
+class DatasetCSVSink:
+    """Appends readings in the full dataset schema, e.g. for the live dashboard to tail"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(os.path.dirname(__file__), '..', DATASET_CSV)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, 'a', newline='')
+        self._header = self._file.tell() == 0
+
+    def write(self, batch):
+        batch.to_csv(self._file, header=self._header, index=False)
+        self._header = False
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class MqttSink:
+    """Publishes readings to cnc/<machine_id>/telemetry
+
+    Readings of the same machine within one batch share a message (a JSON
+    list or one binary wire-format batch), like an edge gateway buffering
+    between uplinks.
+    """
+
+    def __init__(self, broker=MQTT_BROKER, port=MQTT_PORT, qos=0, wire='json'):
+        from pipeline.ingest import make_client
+        self.qos = qos
+        self.wire = wire
+        self.client = make_client('cnc-async-simulator')
+        self.client.connect(broker, port)
+        self.client.loop_start()
+        self.messages = 0
+
+    def write(self, batch):
+        if self.wire == 'binary':
+            from pipeline.wire_format import encode_frame
+            rows = batch[list(COLLECTOR_COLUMNS)].rename(columns=COLLECTOR_COLUMNS)
+            for machine, group in rows.groupby('machine_id', sort=False):
+                self.client.publish(f"cnc/{machine}/telemetry", encode_frame(group), qos=self.qos)
+                self.messages += 1
+            return
+        by_machine = {}
+        for payload in to_payloads(batch):
+            by_machine.setdefault(payload['machine_id'], []).append(payload)
+        for machine, items in by_machine.items():
+            body = json.dumps(items[0] if len(items) == 1 else items)
+            self.client.publish(f"cnc/{machine}/telemetry", body, qos=self.qos)
+        self.messages += len(by_machine)
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+async def _drain(queue, sink, counters):
+    """Writer task: hands batches to the (blocking) sink off the event loop"""
+    while True:
+        batch = await queue.get()
+        if batch is None:
+            return
+        await asyncio.to_thread(sink.write, batch)
+        counters['delivered'] += len(batch)
+
+
+async def simulate(fleet, sink, duration, batch_interval=SIMULATOR_BATCH_INTERVAL_SECONDS, queue_batches=64):
+    """Generate readings for `duration` seconds and return rate statistics
+
+    Every machine keeps an absolute next-due time, advanced by its own
+    jittered period, so the aggregate count tracks the target exactly no
+    matter how the loop is scheduled; the loop only decides how readings
+    are grouped into batches. A slow sink fills the bounded queue and
+    shows up as lag rather than silently lowering the rate.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_batches)
+    counters = {'delivered': 0}
+    writer = asyncio.create_task(_drain(queue, sink, counters))
+
+    t0 = loop.time()
+    wall0 = time.time()
+    end = t0 + duration
+    # Stagger first readings across each machine's period
+    next_due = t0 + fleet.rng.random(len(fleet)) * fleet.periods
+    generated = 0
+    max_lag = 0.0
+    per_second = np.zeros(int(np.ceil(duration)), dtype=np.int64)
+
+    while True:
+        horizon = min(loop.time(), end)
+        frames = []
+        due = np.flatnonzero(next_due <= horizon)
+        while due.size:
+            times = next_due[due]
+            frames.append(fleet.step(due, wall0 + (times - t0)))
+            max_lag = max(max_lag, horizon - float(times.min()))
+            np.add.at(per_second, np.minimum((times - t0).astype(np.int64), len(per_second) - 1), 1)
+            next_due[due] += fleet.next_intervals(due)
+            due = np.flatnonzero(next_due <= horizon)
+        if frames:
+            batch = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            generated += len(batch)
+            await queue.put(batch)
+        if horizon >= end:
+            break
+        await asyncio.sleep(max(batch_interval, min(float(next_due.min()), end) - loop.time()))
+
+    elapsed = loop.time() - t0
+    await queue.put(None)
+    await writer
+    drained = loop.time() - t0
+    full_seconds = per_second[:int(duration)] if duration >= 1 else per_second
+    return {
+        'machines': len(fleet),
+        'target_rate': fleet.target_rate,
+        'generated': generated,
+        'delivered': counters['delivered'],
+        'achieved_rate': generated / duration,
+        'delivered_rate': counters['delivered'] / drained,
+        'rate_error_pct': 100.0 * (generated / duration - fleet.target_rate) / fleet.target_rate,
+        'per_second_min': int(full_seconds.min()) if len(full_seconds) else 0,
+        'per_second_max': int(full_seconds.max()) if len(full_seconds) else 0,
+        'max_lag_ms': max_lag * 1000,
+        'elapsed_s': elapsed,
+        'drain_s': drained - elapsed,
+        'tool_changes': fleet.tool_changes,
+    }
+
+
+def run_load(machines=SIMULATOR_MACHINES, rate=SIMULATOR_TARGET_RATE, duration=10.0, jitter=SIMULATOR_JITTER,
+             sink='collector', seed=42):
+    """Run the async simulator against a sink and print target vs achieved rate"""
+    sinks = {'null': NullSink, 'collector': CollectorSink, 'dataset': DatasetCSVSink, 'mqtt': MqttSink}
+    fleet = VirtualFleet(machines, rate, jitter=jitter, seed=seed)
+    target = sinks[sink]()
+
+    print(f"🚀 Starting async fleet simulation")
+    print(f"   Machines: {machines}  target: {rate:,.0f} readings/s  jitter: ±{jitter:.0%}")
+    print(f"   Sink: {sink}  duration: {duration:.1f}s\n")
+    try:
+        stats = asyncio.run(simulate(fleet, target, duration))
+    finally:
+        target.close()
+
+    print(f"✅ Generated {stats['generated']:,} readings ({stats['tool_changes']} tool changes)")
+    print(f"   Target rate:    {stats['target_rate']:>10,.0f} /s")
+    print(f"   Achieved rate:  {stats['achieved_rate']:>10,.0f} /s ({stats['rate_error_pct']:+.2f}%)")
+    print(f"   Per second:     {stats['per_second_min']:,} - {stats['per_second_max']:,}")
+    print(f"   Delivered rate: {stats['delivered_rate']:>10,.0f} /s (sink drained {stats['drain_s']:.2f}s after end)")
+    print(f"   Max lag:        {stats['max_lag_ms']:>10.1f} ms")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Stress the ingestion path with a simulated plant')
+    parser.add_argument('--machines', type=int, default=SIMULATOR_MACHINES, help='Number of virtual machines')
+    parser.add_argument('--rate', type=float, default=SIMULATOR_TARGET_RATE, help='Target aggregate readings/s')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run')
+    parser.add_argument('--jitter', type=float, default=SIMULATOR_JITTER, help='± fraction of each sampling period')
+    parser.add_argument('--sink', choices=['collector', 'dataset', 'mqtt', 'null'], default='collector',
+                        help='collector: telemetry CSV/store, dataset: dataset CSV (dashboard), '
+                             'mqtt: publish to MQTT_BROKER, null: discard')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    run_load(args.machines, args.rate, args.duration, args.jitter, args.sink, args.seed)
@@ -5,19 +5,32 @@ Simplified version of ingest/mqtt_to_influx.py with CSV fallback
 import os
 import csv
 import sys
+import time
+import atexit
+import threading
+
+import pandas as pd
 
 # Add project root to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from config.settings import TELEMETRY_CSV
+from config.settings import TELEMETRY_CSV, COLLECTOR_FLUSH_ROWS, COLLECTOR_FLUSH_INTERVAL_SECONDS, COLLECTOR_FSYNC
 
+FIELDNAMES = [
+    'timestamp', 'machine_id', 'spindle_rpm', 'feed_rate',
+    'axis_x_pos', 'axis_y_pos', 'axis_z_pos', 'spindle_power',
+    'vib_x', 'vib_y', 'vib_z',
+]
 
-def save_telemetry_to_csv(payload):
-    """Save a telemetry payload to CSV file"""
-    csv_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', TELEMETRY_CSV))
-    
-    # Flatten the nested structure
-    row = {
+
+def default_csv_path():
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), '..', TELEMETRY_CSV))
+
+
+def flatten_payload(payload):
+    """Flatten the nested publisher payload into a CSV row"""
+    vibration = payload.get('vibration', {})
+    return {
         'timestamp': payload.get('ts'),
         'machine_id': payload.get('machine_id'),
         'spindle_rpm': payload.get('spindle_rpm'),
@@ -26,24 +39,153 @@ def save_telemetry_to_csv(payload):
         'axis_y_pos': payload.get('axis_y_pos'),
         'axis_z_pos': payload.get('axis_z_pos'),
         'spindle_power': payload.get('spindle_power'),
-        'vib_x': payload.get('vibration', {}).get('x'),
-        'vib_y': payload.get('vibration', {}).get('y'),
-        'vib_z': payload.get('vibration', {}).get('z'),
+        'vib_x': vibration.get('x'),
+        'vib_y': vibration.get('y'),
+        'vib_z': vibration.get('z'),
     }
-    
-    # Ensure data directory exists
-    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-    
-    # Write to CSV
-    file_exists = os.path.exists(csv_path)
-    with open(csv_path, 'a', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=list(row.keys()))
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(row)
-    
+
+
+class TelemetryCollector:
+    """Long-lived buffered CSV writer for telemetry payloads
+
+    Rows are buffered in memory and written when `flush_rows` rows are
+    pending or `flush_interval` seconds have passed since the last flush;
+    a background thread enforces the interval when readings stop arriving.
+    The file handle stays open until `close()`; with `fsync=True` every
+    flush is also forced to disk. When a TelemetryStore is given, each
+    flush is appended to it as Parquet instead of CSV.
+    """
+
+    def __init__(self, csv_path=None, flush_rows=COLLECTOR_FLUSH_ROWS,
+                 flush_interval=COLLECTOR_FLUSH_INTERVAL_SECONDS, fsync=COLLECTOR_FSYNC, store=None):
+        self.csv_path = csv_path or default_csv_path()
+        self.store = store
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.buffer = []
+        self.rows_written = 0
+        self.flushes = 0
+        self._lock = threading.Lock()
+
+        self._file = None
+        self._closed = False
+        if store is None:
+            os.makedirs(os.path.dirname(self.csv_path), exist_ok=True)
+            self._file = open(self.csv_path, 'a', newline='')
+            self._writer = csv.DictWriter(self._file, fieldnames=FIELDNAMES)
+            if self._file.tell() == 0:
+                self._writer.writeheader()
+
+        self.started_at = time.perf_counter()
+        self._last_flush = self.started_at
+        self._stop = threading.Event()
+        self._flusher = None
+        if self.flush_rows > 1 and self.flush_interval and self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_periodically, name='collector-flush', daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    def _flush_periodically(self):
+        """Flush rows that have waited `flush_interval` seconds, even if no new reading triggers it"""
+        delay = self.flush_interval
+        while not self._stop.wait(delay):
+            with self._lock:
+                due = self._last_flush + self.flush_interval - time.perf_counter()
+                if due <= 0:
+                    self._flush_locked()
+                    due = self.flush_interval
+            delay = due
+
+    def add(self, payload):
+        """Buffer one publisher payload"""
+        self.add_row(flatten_payload(payload))
+
+    def add_row(self, row):
+        """Buffer one already-flat row"""
+        with self._lock:
+            self.buffer.append(row)
+            if len(self.buffer) >= self.flush_rows or time.perf_counter() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def add_rows(self, rows):
+        """Buffer a list of already-flat rows"""
+        with self._lock:
+            self.buffer.extend(rows)
+            if len(self.buffer) >= self.flush_rows or time.perf_counter() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def add_binary(self, buffer):
+        """Buffer every reading of a binary wire-format batch"""
+        from pipeline.wire_format import decode_rows
+        self.add_rows(decode_rows(buffer))
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.perf_counter()
+        if not self.buffer or self._closed:
+            return
+        if self.store is not None:
+            self.store.append(pd.DataFrame(self.buffer, columns=FIELDNAMES))
+        else:
+            self._writer.writerows(self.buffer)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        self.rows_written += len(self.buffer)
+        self.flushes += 1
+        self.buffer = []
+
+    def close(self):
+        """Flush pending rows, stop the flush timer and release the file handle"""
+        self._stop.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        atexit.unregister(self.close)
+
+    def stats(self):
+        """Throughput counters since the collector was created"""
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            'rows_written': self.rows_written,
+            'rows_pending': len(self.buffer),
+            'flushes': self.flushes,
+            'elapsed_s': elapsed,
+            'rows_per_s': self.rows_written / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_default_collector = None
+
+
+def save_telemetry_to_csv(payload):
+    """Save a telemetry payload to CSV file"""
+    global _default_collector
+    if _default_collector is None or _default_collector._closed:
+        # Unbuffered so each call is on disk when it returns, as before
+        _default_collector = TelemetryCollector(flush_rows=1)
+    row = flatten_payload(payload)
+    _default_collector.add_row(row)
+
     print(f"✓ Saved telemetry: RPM={row['spindle_rpm']}, Power={row['spindle_power']}W")
-    return csv_path
+    return _default_collector.csv_path
 
 
 if __name__ == "__main__":
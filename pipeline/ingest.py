@@ -0,0 +1,332 @@
+"""
+Ingest - MQTT telemetry ingestion service
+Subscribes to MQTT_TOPIC_PATTERN, decodes off the network thread and writes batches to the storage backend
+"""
+import os
+import sys
+import json
+import time
+import queue
+import struct
+import argparse
+import threading
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import (
+    MQTT_BROKER, MQTT_PORT, MQTT_TOPIC_PATTERN,
+    INGEST_QUEUE_MESSAGES, INGEST_WRITE_QUEUE_BATCHES, INGEST_BATCH_ROWS,
+    INGEST_BATCH_INTERVAL_SECONDS, INGEST_OVERFLOW
+)
+from pipeline.collector import TelemetryCollector, flatten_payload
+from pipeline.wire_format import is_binary, decode_rows, encode_payloads
+from data.store import telemetry_store, use_parquet
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+
+def make_client(client_id=''):
+    """paho client for either the 1.x or the 2.x callback API"""
+    if mqtt is None:
+        raise RuntimeError("paho-mqtt is not installed (pip install paho-mqtt)")
+    if hasattr(mqtt, 'CallbackAPIVersion'):
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+    return mqtt.Client(client_id=client_id)
+
+
+def decode_payload(payload):
+    """Binary batch or JSON payload (one reading or a list of readings) -> flat collector rows"""
+    if is_binary(payload):
+        return decode_rows(payload)
+    data = json.loads(payload)
+    if isinstance(data, list):
+        return [flatten_payload(item) for item in data]
+    return [flatten_payload(data)]
+
+
+class IngestService:
+    """MQTT subscriber feeding a TelemetryCollector through bounded queues
+
+    The paho network thread only enqueues raw payloads. A decoder thread
+    parses them into rows and hands batches of `batch_rows` (or whatever
+    arrived within `batch_interval`) to a writer thread. Both queues are
+    bounded: when the writer falls behind the decoder blocks, and when the
+    inbox fills the network thread either blocks too - stalling the socket
+    so TCP pushes back on the broker - or drops (overflow="drop").
+    """
+
+    def __init__(self, broker=MQTT_BROKER, port=MQTT_PORT, topic=MQTT_TOPIC_PATTERN, collector=None,
+                 queue_size=INGEST_QUEUE_MESSAGES, write_queue_batches=INGEST_WRITE_QUEUE_BATCHES,
+                 batch_rows=INGEST_BATCH_ROWS, batch_interval=INGEST_BATCH_INTERVAL_SECONDS,
+                 overflow=INGEST_OVERFLOW, qos=0, client_id='cnc-ingest', detector=None, alerts=None):
+        if overflow not in ('block', 'drop'):
+            raise ValueError(f"overflow must be 'block' or 'drop', not {overflow!r}")
+        self.broker = broker
+        self.port = port
+        self.topic = topic
+        self.qos = qos
+        self.overflow = overflow
+        self.batch_rows = batch_rows
+        self.batch_interval = batch_interval
+        if collector is None:
+            store = telemetry_store() if use_parquet() else None
+            collector = TelemetryCollector(store=store, flush_rows=batch_rows)
+        self.collector = collector
+        # Optional streaming stage (e.g. ChatterDetector) run on every decoded chunk
+        self.detector = detector
+        # Optional AlertEngine evaluated on the same chunks
+        self.alerts = alerts
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.outbox = queue.Queue(maxsize=write_queue_batches)
+        self.client = make_client(client_id)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.connected = threading.Event()
+        self.received = 0
+        self.decoded = 0
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.decode_errors = 0
+        self.inbox_high_water = 0
+        self._threads = []
+        self.started_at = None
+
+    def _on_connect(self, client, userdata, flags, *args):
+        client.subscribe(self.topic, qos=self.qos)
+        self.connected.set()
+
+    def _on_message(self, client, userdata, msg):
+        self.received += 1
+        try:
+            self.inbox.put_nowait(msg.payload)
+        except queue.Full:
+            if self.overflow == 'drop':
+                self.dropped += 1
+                return
+            self.blocked += 1
+            self.inbox.put(msg.payload)
+
+    def _decode_loop(self):
+        rows = []
+        deadline = time.perf_counter() + self.batch_interval
+        while True:
+            try:
+                payload = self.inbox.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                payload = b''
+            stop = payload is None
+            payloads = [] if stop or not payload else [payload]
+            # Queue depth before draining, counting the message just taken
+            self.inbox_high_water = max(self.inbox_high_water, self.inbox.qsize() + len(payloads))
+            # Drain whatever else is waiting in one go
+            while not stop and len(payloads) < self.batch_rows:
+                try:
+                    item = self.inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    payloads.append(item)
+            fresh = len(rows)
+            for item in payloads:
+                try:
+                    rows.extend(decode_payload(item))
+                except (ValueError, TypeError, AttributeError, IndexError, struct.error):
+                    self.decode_errors += 1
+            if len(rows) > fresh:
+                # Detect and alert as soon as readings are decoded, before they wait for the write batch
+                if self.detector is not None:
+                    self.detector.update_rows(rows[fresh:])
+                if self.alerts is not None:
+                    self.alerts.update_rows(rows[fresh:])
+            if rows and (stop or len(rows) >= self.batch_rows or time.perf_counter() >= deadline):
+                self.decoded += len(rows)
+                self.outbox.put(rows)
+                rows = []
+            if time.perf_counter() >= deadline:
+                deadline = time.perf_counter() + self.batch_interval
+            if stop:
+                self.outbox.put(None)
+                return
+
+    def _write_loop(self):
+        while True:
+            rows = self.outbox.get()
+            if rows is None:
+                self.collector.flush()
+                return
+            self.collector.add_rows(rows)
+            self.written += len(rows)
+
+    def start(self, timeout=10):
+        """Connect, subscribe and start the decoder and writer threads"""
+        self.started_at = time.perf_counter()
+        self._threads = [
+            threading.Thread(target=self._decode_loop, name='ingest-decode', daemon=True),
+            threading.Thread(target=self._write_loop, name='ingest-write', daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        self.client.connect(self.broker, self.port)
+        self.client.loop_start()
+        if not self.connected.wait(timeout):
+            raise ConnectionError(f"Could not connect to MQTT broker at {self.broker}:{self.port}")
+        return self
+
+    def stop(self):
+        """Disconnect, then drain both queues and flush everything received"""
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.inbox.put(None)
+        for t in self._threads:
+            t.join()
+        self.collector.close()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            'messages': self.received,
+            'rows_written': self.written,
+            'dropped': self.dropped,
+            'blocked': self.blocked,
+            'decode_errors': self.decode_errors,
+            'inbox_depth': self.inbox.qsize(),
+            'inbox_high_water': self.inbox_high_water,
+            'elapsed_s': elapsed,
+            'messages_per_s': self.received / elapsed if elapsed > 0 else 0.0,
+            'rows_per_s': self.written / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def run_ingest(broker=MQTT_BROKER, port=MQTT_PORT, topic=MQTT_TOPIC_PATTERN, report_every=5.0, detect=True, alert=True):
+    """Run the ingestion service until interrupted, printing throughput, chatter events and alerts"""
+    print(f"📥 Ingesting {topic} from {broker}:{port}")
+    detector = None
+    if detect:
+        from analytics.chatter_detection import ChatterDetector
+
+        def print_events(events):
+            for e in events:
+                print(f"   ⚠ {e['machine_id']} {e['type']} {e['state']} at {e['timestamp']} "
+                      f"({e['vibration_g']:.2f} g, z={e['z']:.1f})")
+
+        detector = ChatterDetector()
+        detector.add_listener(print_events)
+    alerts = None
+    if alert:
+        from analytics.alerts import AlertEngine
+
+        def print_alerts(raised):
+            for a in raised:
+                print(f"   🚨 {a['machine_id']} {a['rule']} ({a['severity']}) at {a['raised_at']}: {a['condition']}")
+
+        alerts = AlertEngine()
+        alerts.add_listener(print_alerts)
+    service = IngestService(broker, port, topic, detector=detector, alerts=alerts).start()
+    try:
+        while True:
+            time.sleep(report_every)
+            s = service.stats()
+            print(f"   {s['rows_written']:,} rows ({s['rows_per_s']:,.0f}/s), inbox {s['inbox_depth']}, "
+                  f"dropped {s['dropped']}, decode errors {s['decode_errors']}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        print(f"\n✅ Ingestion stopped: {service.written:,} rows written")
+
+
+def benchmark(readings=200_000, readings_per_message=50, machines=100, wire='json'):
+    """Publish `readings` simulated readings through a local broker and time their ingestion"""
+    import tempfile
+    import numpy as np
+    from pipeline.mqtt_broker import LocalBroker
+    from pipeline.async_simulator import VirtualFleet, to_payloads
+
+    fleet = VirtualFleet(machines, target_rate=machines)
+    payloads = []
+    now = time.time()
+    for i in range(-(-readings // machines)):
+        payloads.extend(to_payloads(fleet.step(np.arange(machines), np.full(machines, now + i))))
+    payloads = payloads[:readings]
+    # One message per machine carrying `readings_per_message` consecutive readings
+    by_machine = {}
+    for p in payloads:
+        by_machine.setdefault(p['machine_id'], []).append(p)
+    encode = encode_payloads if wire == 'binary' else (lambda items: json.dumps(items).encode())
+    messages = [(f"cnc/{machine}/telemetry", encode(items[i:i + readings_per_message]))
+                for machine, items in by_machine.items()
+                for i in range(0, len(items), readings_per_message)]
+
+    broker = LocalBroker('127.0.0.1', 0).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        collector = TelemetryCollector(os.path.join(tmp, 'telemetry.csv'), flush_rows=INGEST_BATCH_ROWS)
+        service = IngestService('127.0.0.1', broker.port, collector=collector).start()
+        publisher = make_client('cnc-bench-publisher')
+        publisher.connect('127.0.0.1', broker.port)
+        publisher.loop_start()
+        start = time.perf_counter()
+        for topic, message in messages:
+            publisher.publish(topic, message)
+        while service.decoded < len(payloads) and time.perf_counter() - start < 120:
+            time.sleep(0.005)
+        service.stop()
+        elapsed = time.perf_counter() - start
+        publisher.loop_stop()
+        publisher.disconnect()
+    broker.stop()
+    return {
+        'readings': len(payloads),
+        'messages': len(messages),
+        'rows_written': service.written,
+        'dropped': service.dropped,
+        'elapsed_s': elapsed,
+        'rows_per_s': service.written / elapsed,
+        'messages_per_s': len(messages) / elapsed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Ingest MQTT telemetry into the telemetry CSV or Parquet store')
+    parser.add_argument('--broker', default=MQTT_BROKER)
+    parser.add_argument('--port', type=int, default=MQTT_PORT)
+    parser.add_argument('--topic', default=MQTT_TOPIC_PATTERN)
+    parser.add_argument('--local-broker', action='store_true',
+                        help='Start the built-in stand-in broker instead of connecting to Mosquitto')
+    parser.add_argument('--no-detect', action='store_true', help='Skip streaming chatter detection')
+    parser.add_argument('--no-alerts', action='store_true', help='Skip streaming alert rules')
+    parser.add_argument('--bench', action='store_true', help='Measure end-to-end ingestion throughput and exit')
+    parser.add_argument('--readings', type=int, default=200_000, help='Readings to publish with --bench')
+    parser.add_argument('--per-message', type=int, default=50, help='Readings per MQTT message with --bench')
+    parser.add_argument('--wire', choices=['json', 'binary'], default='json', help='Payload format with --bench')
+    args = parser.parse_args()
+
+    if args.bench:
+        for per_message in sorted({1, args.per_message}):
+            n = args.readings if per_message > 1 else min(args.readings, 50_000)
+            r = benchmark(n, per_message, wire=args.wire)
+            print(f"   {per_message:>3} readings/msg: {r['rows_written']:,} rows in {r['elapsed_s']:.2f}s "
+                  f"-> {r['rows_per_s']:,.0f} rows/s, {r['messages_per_s']:,.0f} msgs/s")
+    else:
+        broker = None
+        if args.local_broker:
+            from pipeline.mqtt_broker import LocalBroker
+            broker = LocalBroker(args.broker, args.port).start()
+            print(f"📡 Local MQTT broker on {args.broker}:{broker.port}")
+        try:
+            run_ingest(args.broker, args.port, args.topic, detect=not args.no_detect, alert=not args.no_alerts)
+        finally:
+            if broker is not None:
+                broker.stop()
@@ -0,0 +1,180 @@
+"""
+MQTT Broker - Minimal local MQTT 3.1.1 broker
+Stand-in for Mosquitto in tests and benchmarks: CONNECT, SUBSCRIBE (+/# wildcards), PUBLISH QoS 0/1, PING
+"""
+import os
+import sys
+import asyncio
+import argparse
+import threading
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import MQTT_BROKER, MQTT_PORT
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+# Pause reading from a publisher while a subscriber has this much unsent data
+HIGH_WATER_BYTES = 4 * 1024 * 1024
+
+
+def encode_length(n):
+    out = bytearray()
+    while True:
+        byte, n = n % 128, n // 128
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+
+def topic_matches(pattern, topic):
+    """MQTT topic filter match with + (one level) and # (rest) wildcards"""
+    p_parts = pattern.split('/')
+    t_parts = topic.split('/')
+    for i, part in enumerate(p_parts):
+        if part == '#':
+            return True
+        if i >= len(t_parts) or (part != '+' and part != t_parts[i]):
+            return False
+    return len(p_parts) == len(t_parts)
+
+
+class _Session:
+    def __init__(self, writer):
+        self.writer = writer
+        self.filters = set()
+
+
+class LocalBroker:
+    """In-process MQTT broker on asyncio
+
+    Messages are forwarded to subscribers at QoS 0 (QoS 1 publishes are
+    acknowledged to the sender). No retained messages, wills or persistent
+    sessions - just enough protocol for paho clients to talk to each other.
+    """
+
+    def __init__(self, host=MQTT_BROKER, port=MQTT_PORT):
+        self.host = host
+        self.port = port
+        self.sessions = set()
+        self.messages = 0
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    async def _read_packet(self, reader):
+        header = await reader.readexactly(1)
+        multiplier, length = 1, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(length) if length else b''
+        return header[0], body
+
+    async def _forward(self, topic, packet):
+        for session in list(self.sessions):
+            if any(topic_matches(f, topic) for f in session.filters):
+                session.writer.write(packet)
+                if session.writer.transport.get_write_buffer_size() > HIGH_WATER_BYTES:
+                    # Slow subscriber: stop reading from this publisher until it catches up
+                    await session.writer.drain()
+
+    async def _handle(self, reader, writer):
+        session = _Session(writer)
+        try:
+            first, _ = await self._read_packet(reader)
+            if first >> 4 != CONNECT:
+                return
+            writer.write(bytes([CONNACK << 4, 2, 0, 0]))
+            self.sessions.add(session)
+            while True:
+                first, body = await self._read_packet(reader)
+                kind = first >> 4
+                if kind == PUBLISH:
+                    qos = (first >> 1) & 3
+                    topic_len = int.from_bytes(body[:2], 'big')
+                    topic = body[2:2 + topic_len].decode('utf-8')
+                    pos = 2 + topic_len
+                    if qos:
+                        writer.write(bytes([PUBACK << 4, 2]) + body[pos:pos + 2])
+                        payload = body[pos + 2:]
+                    else:
+                        payload = body[pos:]
+                    self.messages += 1
+                    forwarded = body[:2 + topic_len] + payload
+                    await self._forward(topic, bytes([PUBLISH << 4]) + encode_length(len(forwarded)) + forwarded)
+                elif kind == SUBSCRIBE:
+                    packet_id, pos, granted = body[:2], 2, bytearray()
+                    while pos < len(body):
+                        n = int.from_bytes(body[pos:pos + 2], 'big')
+                        session.filters.add(body[pos + 2:pos + 2 + n].decode('utf-8'))
+                        pos += 2 + n + 1
+                        granted.append(0)
+                    writer.write(bytes([SUBACK << 4]) + encode_length(2 + len(granted)) + packet_id + bytes(granted))
+                elif kind == UNSUBSCRIBE:
+                    packet_id, pos = body[:2], 2
+                    while pos < len(body):
+                        n = int.from_bytes(body[pos:pos + 2], 'big')
+                        session.filters.discard(body[pos + 2:pos + 2 + n].decode('utf-8'))
+                        pos += 2 + n
+                    writer.write(bytes([UNSUBACK << 4, 2]) + packet_id)
+                elif kind == PINGREQ:
+                    writer.write(bytes([PINGRESP << 4, 0]))
+                elif kind == DISCONNECT:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    async def serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self):
+        """Run the broker on a background thread; returns once it is listening"""
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self.serve())
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='mqtt-broker', daemon=True)
+        self._thread.start()
+        self._ready.wait(10)
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            for task in asyncio.all_tasks(self._loop):
+                self._loop.call_soon_threadsafe(task.cancel)
+        if self._thread is not None:
+            self._thread.join(5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a minimal local MQTT broker')
+    parser.add_argument('--host', default=MQTT_BROKER)
+    parser.add_argument('--port', type=int, default=MQTT_PORT)
+    args = parser.parse_args()
+    broker = LocalBroker(args.host, args.port)
+    print(f"📡 Local MQTT broker on {args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        asyncio.run(broker.serve())
+    except KeyboardInterrupt:
+        pass
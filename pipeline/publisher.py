@@ -2,10 +2,17 @@
 Publisher - Simulates CNC machine telemetry
 Simplified version of edge/mqtt_publisher.py
 """
+import os
+import sys
 import random
 import json
 from datetime import datetime
 
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline.wire_format import encode_payloads
+
 
 def make_telemetry_payload(machine_id="CNC-01"):
     """Generate a single telemetry reading"""
@@ -26,8 +33,14 @@ def make_telemetry_payload(machine_id="CNC-01"):
     }
 
 
+def make_binary_batch(count=100, machine_id="CNC-01"):
+    """Generate `count` readings as one binary wire-format batch"""
+    return encode_payloads([make_telemetry_payload(machine_id) for _ in range(count)])
+
+
 if __name__ == "__main__":
     # Demo: print sample payload
     sample = make_telemetry_payload()
     print("Sample CNC Telemetry:")
     print(json.dumps(sample, indent=2))
+    print(f"JSON: {len(json.dumps(sample))} bytes, binary batch of 100: {len(make_binary_batch(100)) / 100:.1f} bytes/reading")
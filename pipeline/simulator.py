@@ -11,8 +11,9 @@ import argparse
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from publisher import make_telemetry_payload
-from collector import save_telemetry_to_csv
+from collector import TelemetryCollector
 from config.settings import DEFAULT_SIMULATION_ITERATIONS, DEFAULT_SIMULATION_DELAY
+from data.store import telemetry_store, use_parquet
 
 
 def run_simulation(iterations=DEFAULT_SIMULATION_ITERATIONS, delay=DEFAULT_SIMULATION_DELAY):
@@ -22,15 +23,19 @@ def run_simulation(iterations=DEFAULT_SIMULATION_ITERATIONS, delay=DEFAULT_SIMUL
     print(f"   Delay: {delay}s between readings")
     print(f"   Duration: ~{iterations * delay:.1f}s\n")
     
-    for i in range(iterations):
-        payload = make_telemetry_payload()
-        save_telemetry_to_csv(payload)
-        time.sleep(delay)
-        
-        if (i + 1) % 50 == 0:
-            print(f"   Progress: {i + 1}/{iterations} readings collected")
+    store = telemetry_store() if use_parquet() else None
+    with TelemetryCollector(store=store) as collector:
+        for i in range(iterations):
+            payload = make_telemetry_payload()
+            collector.add(payload)
+            time.sleep(delay)
+            
+            if (i + 1) % 50 == 0:
+                print(f"   Progress: {i + 1}/{iterations} readings collected")
     
+    stats = collector.stats()
     print(f"\n✅ Simulation complete! {iterations} telemetry readings collected.")
+    print(f"   Throughput: {stats['rows_per_s']:.0f} rows/s in {stats['flushes']} flushes")
 
 
 if __name__ == "__main__":
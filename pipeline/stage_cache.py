@@ -0,0 +1,147 @@
+"""
+Stage Cache - Content-addressed build graph for the batch pipeline
+Skips stages whose inputs, code and upstream outputs are unchanged; runs independent stages concurrently
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_MANIFEST = os.path.join(PROJECT_ROOT, '.pipeline_cache', 'manifest.json')
+
+
+class Stage:
+    """One pipeline step
+    
+    Args:
+        name: unique stage name
+        run: callable doing the work
+        outputs: files the stage produces (absolute paths)
+        params: callable or dict of settings that affect the outputs
+        code: source files whose contents version the stage
+        inputs: extra input files (e.g. an existing dataset)
+        deps: names of upstream stages; their outputs become inputs
+    """
+    
+    def __init__(self, name, run, outputs, params=None, code=(), inputs=(), deps=()):
+        self.name = name
+        self.run = run
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.code = list(code)
+        self.inputs = list(inputs)
+        self.deps = list(deps)
+
+
+class StageCache:
+    """Manifest of stage keys and file fingerprints, persisted as JSON
+    
+    File content hashes are memoised by (size, mtime), so unchanged
+    multi-GB inputs are not re-read on every run.
+    """
+    
+    def __init__(self, path=DEFAULT_MANIFEST):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.data = {}
+        self.data.setdefault('files', {})
+        self.data.setdefault('stages', {})
+    
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.data, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+    
+    def file_hash(self, path):
+        """sha256 of a file, or None if missing"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = [st.st_size, st.st_mtime_ns]
+        with self._lock:
+            cached = self.data['files'].get(path)
+        if cached and cached['stamp'] == stamp:
+            return cached['sha256']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        sha = digest.hexdigest()
+        with self._lock:
+            self.data['files'][path] = {'stamp': stamp, 'sha256': sha}
+        return sha
+    
+    def stage_key(self, stage, stages):
+        params = stage.params() if callable(stage.params) else stage.params
+        upstream = [out for dep in stage.deps if dep in stages for out in stages[dep].outputs]
+        material = {
+            'params': params,
+            'code': {os.path.relpath(p, PROJECT_ROOT): self.file_hash(p) for p in stage.code},
+            'inputs': {os.path.relpath(p, PROJECT_ROOT): self.file_hash(p) for p in stage.inputs + upstream},
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode()).hexdigest()
+    
+    def is_fresh(self, stage, key):
+        record = self.data['stages'].get(stage.name)
+        if not record or record['key'] != key:
+            return False
+        # Outputs must still be the files this stage wrote
+        return all(self.file_hash(p) == record['outputs'].get(p) for p in stage.outputs)
+    
+    def record(self, stage, key):
+        outputs = {p: self.file_hash(p) for p in stage.outputs}
+        with self._lock:
+            self.data['stages'][stage.name] = {'key': key, 'outputs': outputs, 'finished_at': time.time()}
+
+
+def run_graph(stages, force=False, max_workers=2, cache=None):
+    """
+    Run stages in dependency order, skipping fresh ones
+    
+    Stages whose dependencies are done run concurrently. Returns a dict
+    of stage name -> 'skipped' | 'ran'.
+    """
+    stages = {s.name: s for s in stages}
+    cache = cache or StageCache()
+    status = {}
+    pending = dict(stages)
+    running = {}
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            ready = [s for s in pending.values() if all(d in status or d not in stages for d in s.deps)]
+            for stage in ready:
+                del pending[stage.name]
+                key = cache.stage_key(stage, stages)
+                if not force and cache.is_fresh(stage, key):
+                    print(f"   ⏭ {stage.name}: up to date, skipped")
+                    status[stage.name] = 'skipped'
+                    continue
+                running[pool.submit(stage.run)] = (stage, key)
+            if not running:
+                if pending and not ready:
+                    raise RuntimeError(f"Unresolvable stage dependencies: {sorted(pending)}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, key = running.pop(future)
+                future.result()
+                cache.record(stage, key)
+                cache.save()
+                status[stage.name] = 'ran'
+    return status
@@ -0,0 +1,192 @@
+"""
+Wire Format - Compact binary telemetry records
+Fixed-layout NumPy structured records with epoch-ns timestamps and per-batch interned machine IDs
+"""
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline.collector import FIELDNAMES, flatten_payload
+
+MAGIC = b'CNT1'
+
+# One telemetry reading; packed little-endian, 46 bytes
+RECORD_DTYPE = np.dtype([
+    ('ts_ns', '<i8'),
+    ('machine', '<u2'),
+    ('spindle_rpm', '<u4'),
+    ('feed_rate', '<f4'),
+    ('axis_x_pos', '<f4'),
+    ('axis_y_pos', '<f4'),
+    ('axis_z_pos', '<f4'),
+    ('spindle_power', '<f4'),
+    ('vib_x', '<f4'),
+    ('vib_y', '<f4'),
+    ('vib_z', '<f4'),
+])
+
+# magic, record count, machine table entries
+_HEADER = struct.Struct('<4sIH')
+
+# Numeric fields shared by the flat collector rows and the record dtype
+NUMERIC_FIELDS = [name for name in RECORD_DTYPE.names if name not in ('ts_ns', 'machine')]
+
+# Decimal places carried on the wire; float32 holds these exactly enough to
+# round-trip, and rounding on decode avoids float32 noise in the CSV
+FIELD_DECIMALS = {
+    'feed_rate': 2,
+    'axis_x_pos': 3, 'axis_y_pos': 3, 'axis_z_pos': 3,
+    'spindle_power': 3,
+    'vib_x': 4, 'vib_y': 4, 'vib_z': 4,
+}
+
+
+def is_binary(payload):
+    return payload[:4] == MAGIC
+
+
+def to_epoch_ns(timestamps):
+    """ISO-8601 strings (trailing Z allowed) -> int64 epoch nanoseconds"""
+    values = np.asarray(timestamps, dtype='U32')
+    values = np.char.rstrip(values, 'Z')
+    return values.astype('datetime64[ns]').astype(np.int64)
+
+
+def from_epoch_ns(ts_ns, unit='ms'):
+    """int64 epoch nanoseconds -> ISO-8601 strings with trailing Z"""
+    return np.char.add(np.datetime_as_string(np.asarray(ts_ns).astype('datetime64[ns]'), unit=unit), 'Z')
+
+
+def encode_arrays(ts_ns, machine_ids, columns):
+    """Encode column arrays into one binary batch
+
+    `machine_ids` are interned into a table sent once per batch; each
+    record carries a 2-byte index into it.
+    """
+    n = len(ts_ns)
+    table, codes = np.unique(np.asarray(machine_ids, dtype=object).astype(str), return_inverse=True)
+    records = np.empty(n, dtype=RECORD_DTYPE)
+    records['ts_ns'] = ts_ns
+    records['machine'] = codes
+    for name in NUMERIC_FIELDS:
+        records[name] = columns[name]
+    parts = [_HEADER.pack(MAGIC, n, len(table))]
+    for machine in table:
+        raw = machine.encode('utf-8')
+        parts.append(bytes([len(raw)]) + raw)
+    parts.append(records.tobytes())
+    return b''.join(parts)
+
+
+def encode_rows(rows):
+    """Encode flat collector rows (dicts with FIELDNAMES keys)"""
+    columns = {name: [row[name] for row in rows] for name in NUMERIC_FIELDS}
+    return encode_arrays(to_epoch_ns([row['timestamp'] for row in rows]),
+                         [row['machine_id'] for row in rows], columns)
+
+
+def encode_payloads(payloads):
+    """Encode publisher payloads (make_telemetry_payload dicts)"""
+    return encode_rows([flatten_payload(p) for p in payloads])
+
+
+def encode_frame(df):
+    """Encode a DataFrame with the collector columns"""
+    return encode_arrays(to_epoch_ns(df['timestamp'].astype(str)), df['machine_id'].to_numpy(),
+                         {name: df[name].to_numpy() for name in NUMERIC_FIELDS})
+
+
+def decode(buffer):
+    """Decode a batch without copying the records
+
+    Returns (records, machines): `records` is a structured array viewing
+    `buffer` directly and `machines` the interned ID table, so
+    `machines[records['machine']]` gives each record's machine ID.
+    """
+    magic, n, entries = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a binary telemetry batch")
+    pos = _HEADER.size
+    machines = []
+    for _ in range(entries):
+        length = buffer[pos]
+        machines.append(bytes(buffer[pos + 1:pos + 1 + length]).decode('utf-8'))
+        pos += 1 + length
+    records = np.frombuffer(buffer, dtype=RECORD_DTYPE, count=n, offset=pos)
+    return records, np.array(machines, dtype=object)
+
+
+def records_to_rows(records, machines):
+    """Decoded records -> flat collector rows"""
+    columns = [from_epoch_ns(records['ts_ns']).tolist(), machines[records['machine']].tolist()]
+    for name in NUMERIC_FIELDS:
+        values = records[name]
+        if name in FIELD_DECIMALS:
+            values = np.round(values.astype(np.float64), FIELD_DECIMALS[name])
+        columns.append(values.tolist())
+    return [dict(zip(FIELDNAMES, values)) for values in zip(*columns)]
+
+
+def decode_rows(buffer):
+    return records_to_rows(*decode(buffer))
+
+
+def benchmark(n=100_000, machines=50, repeat=3):
+    """Bytes per reading and encode/decode rates for JSON vs binary batches"""
+    from pipeline.async_simulator import VirtualFleet, to_payloads
+
+    fleet = VirtualFleet(machines, target_rate=machines)
+    payloads = []
+    now = time.time()
+    for i in range(-(-n // machines)):
+        payloads.extend(to_payloads(fleet.step(np.arange(machines), np.full(machines, now + i))))
+    payloads = payloads[:n]
+    rows = [flatten_payload(p) for p in payloads]
+
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            out = fn()
+            times.append(time.perf_counter() - t)
+        return min(times), out
+
+    json_enc, json_blob = best(lambda: json.dumps(payloads).encode())
+    json_dec, _ = best(lambda: [flatten_payload(p) for p in json.loads(json_blob)])
+    bin_enc, bin_blob = best(lambda: encode_rows(rows))
+    bin_view, _ = best(lambda: decode(bin_blob))
+    bin_dec, decoded = best(lambda: decode_rows(bin_blob))
+    assert len(decoded) == n
+
+    return {
+        'readings': n,
+        'json_bytes_per_reading': len(json_blob) / n,
+        'binary_bytes_per_reading': len(bin_blob) / n,
+        'json_encode_per_s': n / json_enc,
+        'binary_encode_per_s': n / bin_enc,
+        'json_decode_per_s': n / json_dec,
+        'binary_decode_view_us': bin_view * 1e6,
+        'binary_decode_rows_per_s': n / bin_dec,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark binary telemetry batches against JSON')
+    parser.add_argument('--readings', type=int, default=100_000)
+    args = parser.parse_args()
+
+    r = benchmark(args.readings)
+    print(f"📦 {r['readings']:,} readings")
+    print(f"   {'':<22}{'JSON':>14}{'binary':>14}")
+    print(f"   {'bytes/reading':<22}{r['json_bytes_per_reading']:>14.1f}{r['binary_bytes_per_reading']:>14.1f}")
+    print(f"   {'encode readings/s':<22}{r['json_encode_per_s']:>14,.0f}{r['binary_encode_per_s']:>14,.0f}")
+    print(f"   {'decode to rows/s':<22}{r['json_decode_per_s']:>14,.0f}{r['binary_decode_rows_per_s']:>14,.0f}")
+    print(f"   {'zero-copy NumPy view':<22}{'-':>14}{r['binary_decode_view_us']:>11.0f} µs (whole batch)")
@@ -8,89 +8,171 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Image, Spacer, Page
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.enums import TA_LEFT
 from reportlab.lib import colors
-from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import r2_score, accuracy_score
 import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 # Add project root to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from config.settings import DATASET_CSV, REPORT_OUTPUT_DIR, REPORT_TITLE
+from config.settings import DATASET_CSV, REPORT_OUTPUT_DIR, REPORT_TITLE, FIGURE_MAX_POINTS, REPORT_FIGURE_WORKERS
+from data.store import dataset_store, use_parquet, dataset_hash
+from analytics.analyze import CNCAnalytics, load_metrics_artifact, artifact_is_current
 
 
 def load_dataset(csv_path):
+    if use_parquet():
+        store = dataset_store()
+        if store.exists():
+            return store.read()
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"Dataset not found: {csv_path}")
     df = pd.read_csv(csv_path, parse_dates=["timestamp"]) if "timestamp" in open(csv_path).readline() else pd.read_csv(csv_path)
     return df
 
 
-def make_figs(df, figs_dir):
-    os.makedirs(figs_dir, exist_ok=True)
+def worker_context():
+    """Start method for report process pools: fresh workers, not forks of a parent holding data and pyplot state"""
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
 
-    # Time-series spindle temperature
+def minmax_decimate(x, y, max_points):
+    """
+    Keep the min and max of `y` in each of max_points/2 equal buckets
+    
+    Peaks and dips survive decimation, unlike plain striding. Returns the
+    selected x, y in their original order.
+    """
+    n = len(y)
+    if n <= max_points:
+        return x, y
+    buckets = max(1, max_points // 2)
+    size = -(-n // buckets)
+    # Pad the last bucket with the final value so every bucket has `size` points
+    y_arr = np.asarray(y, dtype=float)
+    grid = np.pad(y_arr, (0, size * buckets - n), mode='edge').reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    keep = np.concatenate([offsets + grid.argmin(axis=1), offsets + grid.argmax(axis=1)])
+    keep = np.unique(np.minimum(keep, n - 1))
+    return np.asarray(x)[keep], y_arr[keep]
+
+
+def _render_temp(f_temp, ts, temp):
     plt.figure(figsize=(8, 3))
-    plt.plot(df["timestamp"], df["spindle_temp_c"], label="Spindle Temp (C)")
+    plt.plot(ts, temp, label="Spindle Temp (C)")
     plt.axhline(80, color='r', linestyle='--', alpha=0.5, label='Critical 80C')
     plt.legend(); plt.tight_layout()
-    f_temp = os.path.join(figs_dir, "spindle_temp_timeseries.png"); plt.savefig(f_temp); plt.close()
+    plt.savefig(f_temp); plt.close()
+    return f_temp
 
-    # Histogram of surface roughness
+
+def _render_roughness(f_rough, counts, edges):
     plt.figure(figsize=(6, 3))
-    plt.hist(df["surface_roughness_ra_um"], bins=30, color="#6c8ebf")
+    plt.stairs(counts, edges, fill=True, color="#6c8ebf")
     plt.title("Surface Roughness (Ra) Distribution"); plt.tight_layout()
-    f_rough = os.path.join(figs_dir, "surface_roughness_hist.png"); plt.savefig(f_rough); plt.close()
+    plt.savefig(f_rough); plt.close()
+    return f_rough
+
 
-    # Chatter markers over time (simple scatter)
+def _render_chatter(f_chatter, ts_ok, force_ok, ts_chatter, force_chatter):
     plt.figure(figsize=(8, 3))
-    ts = df["timestamp"]
-    y = df["cutting_force_n"]
-    colors_pts = np.where(df["chatter_detected"], "red", "#2ecc71")
-    plt.scatter(ts, y, s=6, c=colors_pts)
+    plt.scatter(ts_ok, force_ok, s=6, c="#2ecc71")
+    plt.scatter(ts_chatter, force_chatter, s=6, c="red")
     plt.title("Cutting Force with Chatter Events (red)"); plt.tight_layout()
-    f_chatter = os.path.join(figs_dir, "cutting_force_chatter.png"); plt.savefig(f_chatter); plt.close()
+    plt.savefig(f_chatter); plt.close()
+    return f_chatter
 
-    return f_temp, f_rough, f_chatter
 
+def make_figs(df, figs_dir, max_points=FIGURE_MAX_POINTS, workers=REPORT_FIGURE_WORKERS):
+    """
+    Render the report figures in parallel from decimated data
+    
+    Time series are min/max decimated to about `max_points` points and the
+    histogram is binned in NumPy, so render time does not grow with the
+    dataset. Chatter events are decimated separately from normal points so
+    they are never thinned out by them.
+    """
+    os.makedirs(figs_dir, exist_ok=True)
+    f_temp = os.path.join(figs_dir, "spindle_temp_timeseries.png")
+    f_rough = os.path.join(figs_dir, "surface_roughness_hist.png")
+    f_chatter = os.path.join(figs_dir, "cutting_force_chatter.png")
 
-def train_models(df):
-    # Features for regression/classification
-    features = [
-        "spindle_speed_rpm", "feed_rate_mm_min", "vibration_x_g", "vibration_y_g", "vibration_z_g",
-        "spindle_temp_c", "motor_temp_c", "cutting_force_n", "acoustic_emission_ae", "power_consumption_kw"
+    ts = df["timestamp"]
+    if isinstance(ts.dtype, pd.DatetimeTZDtype):
+        # Naive UTC datetime64 instead of an object array of Timestamps
+        ts = ts.dt.tz_convert(None)
+    ts = ts.to_numpy()
+    force = df["cutting_force_n"].to_numpy(dtype=float)
+    chatter = df["chatter_detected"].to_numpy(dtype=bool)
+    roughness = df["surface_roughness_ra_um"].to_numpy(dtype=float)
+    counts, edges = np.histogram(roughness[~np.isnan(roughness)], bins=30)
+
+    jobs = [
+        (_render_temp, (f_temp,) + minmax_decimate(ts, df["spindle_temp_c"].to_numpy(dtype=float), max_points)),
+        (_render_roughness, (f_rough, counts, edges)),
+        (_render_chatter, (f_chatter,)
+            + minmax_decimate(ts[~chatter], force[~chatter], max_points)
+            + minmax_decimate(ts[chatter], force[chatter], max_points)),
     ]
-    dfm = df.dropna(subset=features + ["surface_roughness_ra_um", "tool_wear_state"]).copy()
-
-    # Regressor: predict surface roughness
-    Xr = dfm[features].values
-    yr = dfm["surface_roughness_ra_um"].values
-    Xr_tr, Xr_te, yr_tr, yr_te = train_test_split(Xr, yr, test_size=0.25, random_state=0)
-    rfr = RandomForestRegressor(n_estimators=120, random_state=0)
-    rfr.fit(Xr_tr, yr_tr)
-    pred_r = rfr.predict(Xr_te)
-    r2 = r2_score(yr_te, pred_r)
-
-    # Classifier: predict tool wear state
-    Xc = dfm[features].values
-    yc = dfm["tool_wear_state"].values.astype(int)
-    Xc_tr, Xc_te, yc_tr, yc_te = train_test_split(Xc, yc, test_size=0.25, random_state=0)
-    rfc = RandomForestClassifier(n_estimators=150, random_state=0)
-    rfc.fit(Xc_tr, yc_tr)
-    pred_c = rfc.predict(Xc_te)
-    acc = accuracy_score(yc_te, pred_c)
-
-    return {"roughness_model": rfr, "wear_model": rfc, "r2": r2, "acc": acc}
-
-
-def build_pdf(df, figs, metrics, out_pdf):
+
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=worker_context()) as pool:
+            futures = [pool.submit(fn, *args) for fn, args in jobs]
+            for future in futures:
+                future.result()
+    else:
+        for fn, args in jobs:
+            fn(*args)
+
+    return f_temp, f_rough, f_chatter
+
+
+def train_models(df, data_hash=None):
+    """Train both forests through CNCAnalytics (parallel) and persist them with their metrics"""
+    analytics = CNCAnalytics()
+    analytics.df = df
+    analytics.dataset_hash = data_hash
+    analytics.train_models()
+    if data_hash is not None:
+        analytics.save_models()
+    m = analytics.metrics
+    return {"roughness_model": analytics.models["roughness"], "wear_model": analytics.models["wear"],
+            "r2": m["roughness_r2"], "acc": m["wear_accuracy"]}
+
+
+def load_metrics(dataset_csv, df):
+    """Metrics from the saved artifact when it matches the dataset, otherwise train once and save"""
+    data_hash = dataset_hash(dataset_csv)
+    artifact = load_metrics_artifact()
+    if artifact_is_current(artifact, data_hash):
+        print("Reusing saved model metrics for this dataset")
+        m = artifact["metrics"]
+        return {"r2": m["roughness_r2"], "acc": m["wear_accuracy"]}
+    return train_models(df, data_hash)
+
+
+def summary_stats(df):
+    """Vibration percentiles, average temperature and RUL used in the report text"""
+    vib_mag = np.sqrt(df['vibration_x_g']**2 + df['vibration_y_g']**2 + df['vibration_z_g']**2)
+    return {
+        'vib_p80': float(np.percentile(vib_mag, 80)),
+        'vib_p95': float(np.percentile(vib_mag, 95)),
+        'temp_avg': float(df['spindle_temp_c'].mean()),
+        'rul_avg': float(df['remaining_useful_life_min'].mean()),
+    }
+
+
+def build_pdf(df, figs, metrics, out_pdf, stats=None, title="CNC machine digital twin analysis report"):
     os.makedirs(os.path.dirname(out_pdf), exist_ok=True)
     styles = getSampleStyleSheet()
     styles['Normal'].alignment = TA_LEFT
     doc = SimpleDocTemplate(out_pdf)
+    if stats is None:
+        stats = summary_stats(df)
 
     story = []
-    story.append(Paragraph("CNC machine digital twin analysis report", styles['Title']))
+    story.append(Paragraph(title, styles['Title']))
     story.append(Spacer(1, 12))
 
     # 1. Executive summary
@@ -106,9 +188,8 @@ def build_pdf(df, figs, metrics, out_pdf):
     # 2. Machine health and predictive maintenance
     story.append(Paragraph("2. Machine health and predictive maintenance", styles['Heading2']))
     # Vibration analysis text
-    vib_mag = np.sqrt(df['vibration_x_g']**2 + df['vibration_y_g']**2 + df['vibration_z_g']**2)
-    vib_p20 = np.percentile(vib_mag, 80)
-    vib_p95 = np.percentile(vib_mag, 95)
+    vib_p20 = stats['vib_p80']
+    vib_p95 = stats['vib_p95']
     story.append(Paragraph(
         f"Vibration analysis: Vibration magnitude increases towards end-of-life; 80th percentile at {vib_p20:.2f} g and 95th percentile at {vib_p95:.2f} g.",
         styles['Normal']))
@@ -119,14 +200,14 @@ def build_pdf(df, figs, metrics, out_pdf):
     story.append(Spacer(1, 8))
 
     # Thermal performance paragraph and figure
-    t_avg = float(df['spindle_temp_c'].mean())
+    t_avg = stats['temp_avg']
     story.append(Paragraph(
         f"Thermal performance: Average spindle temperature {t_avg:.1f} °C with critical threshold at 80 °C.", styles['Normal']))
     story.append(Image(figs[0], width=500, height=180))
     story.append(Spacer(1, 8))
 
     # RUL estimate (simple summary from dataset)
-    rul_avg = float(df['remaining_useful_life_min'].mean())
+    rul_avg = stats['rul_avg']
     story.append(Paragraph(
         f"Remaining useful life (RUL): Current tool estimated average RUL of {rul_avg:.1f} minutes based on wear progression.",
         styles['Normal']))
@@ -157,20 +238,43 @@ def build_pdf(df, figs, metrics, out_pdf):
     print("Wrote", out_pdf)
 
 
-def main():
-    # Defaults
+FIGURE_FILES = ("spindle_temp_timeseries.png", "surface_roughness_hist.png", "cutting_force_chatter.png")
+
+
+def report_paths():
+    """(dataset_csv, out_pdf, figs_dir) for the default report"""
     base_dir = os.path.dirname(__file__)
     dataset_csv = os.path.abspath(os.path.join(base_dir, "..", DATASET_CSV))
     output_dir = os.path.join(base_dir, REPORT_OUTPUT_DIR)
     os.makedirs(output_dir, exist_ok=True)
-    
-    out_pdf = os.path.join(output_dir, "digital_twin_analysis_report.pdf")
-    figs_dir = os.path.join(output_dir, "figures")
+    return dataset_csv, os.path.join(output_dir, "digital_twin_analysis_report.pdf"), os.path.join(output_dir, "figures")
+
+
+def render_figures():
+    """Figure stage: render the report figures from the dataset"""
+    dataset_csv, _, figs_dir = report_paths()
+    return make_figs(load_dataset(dataset_csv), figs_dir)
+
+
+def build_report(figs=None):
+    """Report stage: build the PDF from already rendered figures"""
+    dataset_csv, out_pdf, figs_dir = report_paths()
+    if figs is None:
+        figs = tuple(os.path.join(figs_dir, name) for name in FIGURE_FILES)
+    df = load_dataset(dataset_csv)
+    metrics = load_metrics(dataset_csv, df)
+    build_pdf(df, figs, metrics, out_pdf, title=REPORT_TITLE)
+    return out_pdf
+
+
+def main():
+    # Defaults
+    dataset_csv, out_pdf, figs_dir = report_paths()
 
     df = load_dataset(dataset_csv)
     figs = make_figs(df, figs_dir)
-    metrics = train_models(df)
-    build_pdf(df, figs, metrics, out_pdf)
+    metrics = load_metrics(dataset_csv, df)
+    build_pdf(df, figs, metrics, out_pdf, title=REPORT_TITLE)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+"""
+Fleet Reports - Per-machine and per-operation report sharding
+Splits the dataset once, aggregates shard statistics with one grouped pass and builds shard PDFs in parallel
+"""
+import os
+import re
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib import colors
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import REPORT_OUTPUT_DIR, FLEET_REPORT_WORKERS
+from reports.analyze_and_report import load_dataset, load_metrics, make_figs, build_pdf, report_paths, worker_context
+
+SHARD_KEYS = {
+    'machine': ['machine_id'],
+    'operation': ['operation_id'],
+    'machine-operation': ['machine_id', 'operation_id'],
+}
+
+
+def shard_statistics(df, keys):
+    """
+    Per-shard report statistics from one grouped aggregation
+    
+    Returns a DataFrame indexed by `keys` with row counts, time range,
+    vibration percentiles, average temperature, roughness and RUL.
+    """
+    frame = pd.DataFrame({
+        'vib_mag': np.sqrt(df['vibration_x_g']**2 + df['vibration_y_g']**2 + df['vibration_z_g']**2),
+        'spindle_temp_c': df['spindle_temp_c'],
+        'surface_roughness_ra_um': df['surface_roughness_ra_um'],
+        'remaining_useful_life_min': df['remaining_useful_life_min'],
+        'chatter_detected': df['chatter_detected'].astype(bool),
+        'timestamp': df['timestamp'],
+    })
+    for k in keys:
+        frame[k] = df[k]
+    grouped = frame.groupby(keys, sort=True)
+    stats = grouped.agg(
+        rows=('vib_mag', 'size'),
+        start=('timestamp', 'min'),
+        end=('timestamp', 'max'),
+        temp_avg=('spindle_temp_c', 'mean'),
+        temp_max=('spindle_temp_c', 'max'),
+        roughness_avg=('surface_roughness_ra_um', 'mean'),
+        rul_avg=('remaining_useful_life_min', 'mean'),
+        chatter_events=('chatter_detected', 'sum'),
+    )
+    quantiles = grouped['vib_mag'].quantile([0.8, 0.95]).unstack()
+    stats['vib_p80'] = quantiles[0.8]
+    stats['vib_p95'] = quantiles[0.95]
+    return stats
+
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value))
+
+
+def shard_label(keys, key_values):
+    if not isinstance(key_values, tuple):
+        key_values = (key_values,)
+    return ' / '.join(str(v) for v in key_values), '__'.join(_slug(v) for v in key_values)
+
+
+def _build_shard(shard, title, out_dir, metrics, stats):
+    """Worker: figures and PDF for one shard"""
+    figs = make_figs(shard, os.path.join(out_dir, 'figures'), workers=1)
+    out_pdf = os.path.join(out_dir, 'report.pdf')
+    build_pdf(shard, figs, metrics, out_pdf, stats=stats, title=title)
+    return out_pdf
+
+
+def build_fleet_index(stats, keys, pdfs, out_dir):
+    """Write fleet_index.csv and a fleet_index.pdf summary table"""
+    index = stats.copy()
+    index['report'] = [os.path.relpath(pdfs[k], out_dir) for k in index.index]
+    index.to_csv(os.path.join(out_dir, 'fleet_index.csv'))
+
+    styles = getSampleStyleSheet()
+    doc = SimpleDocTemplate(os.path.join(out_dir, 'fleet_index.pdf'))
+    header = keys + ['Rows', 'Vib p95 (g)', 'Temp avg (°C)', 'Ra avg (µm)', 'RUL avg (min)', 'Chatter', 'Report']
+    rows = [header]
+    for key_values, r in index.iterrows():
+        key_values = key_values if isinstance(key_values, tuple) else (key_values,)
+        rows.append(list(key_values) + [
+            int(r['rows']), f"{r['vib_p95']:.2f}", f"{r['temp_avg']:.1f}", f"{r['roughness_avg']:.3f}",
+            f"{r['rul_avg']:.1f}", int(r['chatter_events']), r['report'],
+        ])
+    table = Table(rows, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+    ]))
+    doc.build([
+        Paragraph("Fleet report index", styles['Title']),
+        Paragraph(f"{len(index)} shards by {', '.join(keys)}; {int(index['rows'].sum())} readings.", styles['Normal']),
+        Spacer(1, 8),
+        table,
+    ])
+    return index
+
+
+def build_fleet_reports(df, by='machine', out_dir=None, metrics=None, workers=FLEET_REPORT_WORKERS):
+    """
+    Build one PDF per shard plus a fleet index
+    
+    At most `2 * workers` shards are in flight at once, so peak memory is
+    bounded by a few shard copies on top of the dataset itself.
+    """
+    keys = SHARD_KEYS[by]
+    if out_dir is None:
+        out_dir = os.path.join(os.path.dirname(__file__), REPORT_OUTPUT_DIR, 'fleet', by)
+    os.makedirs(out_dir, exist_ok=True)
+
+    stats = shard_statistics(df, keys)
+    groups = df.groupby(keys, sort=True).indices  # one pass: shard key -> row positions
+    pdfs = {}
+    max_in_flight = max(1, 2 * workers)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as pool:
+        in_flight = {}
+        for key_values, positions in groups.items():
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pdfs[in_flight.pop(future)] = future.result()
+            label, slug = shard_label(keys, key_values)
+            shard_stats = stats.loc[key_values, ['vib_p80', 'vib_p95', 'temp_avg', 'rul_avg']].astype(float).to_dict()
+            future = pool.submit(
+                _build_shard, df.iloc[positions], f"CNC digital twin report: {label}",
+                os.path.join(out_dir, slug), metrics, shard_stats
+            )
+            in_flight[future] = key_values
+        for future in list(in_flight):
+            pdfs[in_flight.pop(future)] = future.result()
+
+    index = build_fleet_index(stats, keys, pdfs, out_dir)
+    print(f"Wrote {len(pdfs)} shard reports and fleet index to {out_dir}")
+    return index
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Build per-machine / per-operation fleet reports')
+    ap.add_argument('--by', choices=sorted(SHARD_KEYS), default='machine')
+    ap.add_argument('--workers', type=int, default=FLEET_REPORT_WORKERS)
+    ap.add_argument('--out', default=None)
+    args = ap.parse_args()
+
+    dataset_csv, _, _ = report_paths()
+    df = load_dataset(dataset_csv)
+    metrics = load_metrics(dataset_csv, df)
+    build_fleet_reports(df, by=args.by, out_dir=args.out, metrics={'r2': metrics['r2'], 'acc': metrics['acc']},
+                        workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,10 +9,17 @@ import argparse
 # Add project root to path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from data.generate_dataset import synthesize
-from config.settings import DATASET_CSV, DATA_ROWS, NUM_MACHINES, NUM_OPERATIONS, DATA_SEED
+from data.generate_dataset import write_dataset
+from data.store import dataset_store, use_parquet
+from config.settings import (
+    DATASET_CSV, DATA_ROWS, NUM_MACHINES, NUM_OPERATIONS, DATA_SEED,
+    STORAGE_BACKEND, REPORT_TITLE, FIGURE_MAX_POINTS, REPORT_FIGURE_WORKERS
+)
+from pipeline.stage_cache import Stage, run_graph
 import pandas as pd
 
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
 
 def print_banner():
     """Print welcome banner"""
@@ -29,43 +36,97 @@ def generate_data():
     print(f"   Machines: {NUM_MACHINES}")
     print(f"   Operations: {NUM_OPERATIONS}")
     
-    df = synthesize(rows=DATA_ROWS, machines=NUM_MACHINES, operations=NUM_OPERATIONS, seed=DATA_SEED)
-    
     csv_path = os.path.join(os.path.dirname(__file__), DATASET_CSV)
     os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-    df.to_csv(csv_path, index=False)
+    store = dataset_store() if use_parquet() else None
+    written = write_dataset(csv_path, rows=DATA_ROWS, machines=NUM_MACHINES, operations=NUM_OPERATIONS, seed=DATA_SEED,
+                            store=store)
     
     print(f"   ✓ Dataset saved: {csv_path}")
-    print(f"   ✓ {len(df)} records generated\n")
+    if store is not None:
+        print(f"   ✓ Parquet store: {store.root}")
+    print(f"   ✓ {written} records generated\n")
 
 
-def run_analytics():
-    """Run ML analysis"""
+def run_analytics(force=False):
+    """Run ML analysis; `force` retrains even if the saved models are current"""
     print("🤖 Step 2: Running machine learning analysis...")
     
     from analytics.analyze import run_full_analysis
-    models, metrics, insights = run_full_analysis()
+    models, metrics, insights = run_full_analysis(force=force)
+    
+    print()
+
+
+def render_figures():
+    """Render report figures"""
+    print("📈 Step 3a: Rendering report figures...")
+    
+    from reports.analyze_and_report import render_figures as render
+    render()
     
     print()
 
 
-def generate_report():
-    """Generate PDF report"""
-    print("📄 Step 3: Generating comprehensive report...")
+def build_report():
+    """Build the PDF from rendered figures and saved metrics"""
+    print("📄 Step 3b: Building PDF report...")
     
-    from reports.analyze_and_report import main as generate_pdf_report
-    generate_pdf_report()
+    from reports.analyze_and_report import build_report as build
+    build()
     
     print()
 
 
-def launch_dashboard():
+def build_stages(generate=True, force=False):
+    """Pipeline stages with their inputs, code and outputs for the stage cache"""
+    from analytics.analyze import models_dir, training_settings, MODEL_NAMES, METRICS_FILE
+    from reports.analyze_and_report import report_paths, FIGURE_FILES
+    
+    def src(*paths):
+        return [os.path.join(ROOT, p) for p in paths]
+    
+    csv_path = os.path.join(ROOT, DATASET_CSV)
+    models_path = models_dir()
+    _, out_pdf, figs_dir = report_paths()
+    
+    stages = [
+        Stage('train', lambda: run_analytics(force),
+              outputs=[os.path.join(models_path, f'{name}_model.{ext}') for name in MODEL_NAMES for ext in ('pkl', 'npz')]
+                      + [os.path.join(models_path, METRICS_FILE)],
+              params=lambda: {'training': training_settings(), 'storage': STORAGE_BACKEND},
+              code=src('analytics/analyze.py', 'analytics/features.py', 'analytics/compiled_forest.py',
+                       'analytics/incremental.py', 'data/store.py'),
+              inputs=[csv_path], deps=['generate']),
+        Stage('figures', render_figures,
+              outputs=[os.path.join(figs_dir, name) for name in FIGURE_FILES],
+              params={'storage': STORAGE_BACKEND, 'max_points': FIGURE_MAX_POINTS, 'workers': REPORT_FIGURE_WORKERS},
+              code=src('reports/analyze_and_report.py', 'data/store.py'),
+              inputs=[csv_path], deps=['generate']),
+        Stage('report', build_report,
+              outputs=[out_pdf],
+              params={'title': REPORT_TITLE},
+              code=src('reports/analyze_and_report.py'),
+              deps=['train', 'figures']),
+    ]
+    if generate:
+        stages.insert(0, Stage(
+            'generate', generate_data,
+            outputs=[csv_path],
+            params={'rows': DATA_ROWS, 'machines': NUM_MACHINES, 'operations': NUM_OPERATIONS,
+                    'seed': DATA_SEED, 'storage': STORAGE_BACKEND},
+            code=src('data/generate_dataset.py', 'data/store.py'),
+        ))
+    return stages
+
+
+def launch_dashboard(production=None):
     """Launch web dashboard"""
     print("🌐 Step 4: Launching interactive dashboard...")
     print()
     
     from dashboard.app import run_dashboard
-    run_dashboard()
+    run_dashboard(production)
 
 
 def main():
@@ -87,8 +148,14 @@ Examples:
   # Run only dashboard
   python run.py --dashboard-only
   
+  # Dashboard on preforked gunicorn workers (see DASHBOARD_WORKERS / DASHBOARD_THREADS)
+  python run.py --dashboard-only --production
+  
   # Skip dashboard (run data + analysis only)
   python run.py --no-dashboard
+  
+  # Ignore the stage cache and rebuild everything
+  python run.py --force
         """
     )
     
@@ -96,6 +163,9 @@ Examples:
     parser.add_argument('--analysis-only', action='store_true', help='Only run analysis (requires existing dataset)')
     parser.add_argument('--dashboard-only', action='store_true', help='Only launch dashboard (requires existing dataset)')
     parser.add_argument('--no-dashboard', action='store_true', help='Skip dashboard launch')
+    parser.add_argument('--force', action='store_true', help='Rerun every stage even if its cached outputs are current')
+    parser.add_argument('--production', action='store_true', default=None,
+                        help='Serve the dashboard with preforked gunicorn workers instead of the Flask dev server')
     
     args = parser.parse_args()
     
@@ -103,20 +173,17 @@ Examples:
     
     try:
         if args.data_only:
-            generate_data()
+            run_graph([s for s in build_stages(force=args.force) if s.name == 'generate'], force=args.force)
         elif args.analysis_only:
-            run_analytics()
-            generate_report()
+            run_graph(build_stages(generate=False, force=args.force), force=args.force)
         elif args.dashboard_only:
-            launch_dashboard()
+            launch_dashboard(args.production)
         else:
-            # Full pipeline
-            generate_data()
-            run_analytics()
-            generate_report()
+            # Full pipeline; unchanged stages are skipped, training and figures run concurrently
+            run_graph(build_stages(force=args.force), force=args.force)
             
             if not args.no_dashboard:
-                launch_dashboard()
+                launch_dashboard(args.production)
             else:
                 print("✅ All steps complete!")
                 print("\nTo launch dashboard later, run:")